@@ -3,19 +3,23 @@ import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_mail import Mail
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+import sqlite_profile
+import replicas
+
+# Serverless hosts such as Vercel set VERCEL; there every import counts
+# towards the cold start
+SERVERLESS = bool(os.environ.get('VERCEL'))
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO' if SERVERLESS else 'DEBUG').upper())
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': replicas.RoutingSession})
 login_manager = LoginManager()
-mail = Mail()
 
 # Create the app
 app = Flask(__name__)
@@ -24,19 +28,109 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///festagram.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# File-backed SQLite runs with WAL, a busy timeout and BEGIN IMMEDIATE for
+# writes (see sqlite_profile.py); SQLITE_PROFILE=false restores the defaults
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'true').lower() == 'true'
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes
+app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', 64 * 1024))  # KiB
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 5))
+sqlite_profile.configure(app.config)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_profile.engine_options(app.config)
+
+# Read replicas (comma-separated URLs). Read-only GET requests are spread
+# over them round-robin, skipping any that fail a health check; writes and
+# a user's requests for REPLICA_STICKY_SECONDS after a write use the primary
+replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+app.config['SQLALCHEMY_BINDS'] = {f'replica{i}': url for i, url in enumerate(replica_urls)}
+app.config['REPLICA_BINDS'] = list(app.config['SQLALCHEMY_BINDS'])
+app.config['REPLICA_HEALTH_INTERVAL'] = int(os.environ.get('REPLICA_HEALTH_INTERVAL', 30))
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
 # Mail configuration
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@festagram.edu')
+app.config['MAIL_ENABLED'] = bool(app.config['MAIL_USERNAME']) or os.environ.get('MAIL_ENABLED', 'false').lower() == 'true'
+app.config['MAIL_BATCH_SIZE'] = int(os.environ.get('MAIL_BATCH_SIZE', 100))
+app.config['MAIL_MAX_PER_SECOND'] = float(os.environ.get('MAIL_MAX_PER_SECOND', 10))
+app.config['MAIL_MAX_ATTEMPTS'] = int(os.environ.get('MAIL_MAX_ATTEMPTS', 5))
+app.config['MAIL_RETRY_BASE_SECONDS'] = int(os.environ.get('MAIL_RETRY_BASE_SECONDS', 60))
+
+# Page cache for public views: 'memory', 'filesystem', 'redis' or 'null'.
+# Invalidations only reach processes sharing the backend, so 'memory' is
+# for a single process; 'filesystem' covers the workers on one host. Off by
+# default on serverless hosts, whose instances share nothing but redis
+app.config['CACHE_TYPE'] = os.environ.get('CACHE_TYPE', 'null' if SERVERLESS else 'filesystem')
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 60))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 1000))
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+# Live seat counts and unread badges over Server-Sent Events (/api/live).
+# 'memory' delivers within one process; use 'redis' with several workers.
+# Every open stream holds a server thread for up to LIVE_MAX_AGE, so this is
+# opt-in: only enable it on threaded or async workers (never sync gunicorn
+# workers or serverless hosts) and keep LIVE_MAX_CONNECTIONS below the
+# thread count
+app.config['LIVE_ENABLED'] = os.environ.get('LIVE_ENABLED', 'false').lower() == 'true'
+app.config['LIVE_BROKER'] = os.environ.get('LIVE_BROKER', 'memory')
+app.config['LIVE_REDIS_URL'] = os.environ.get('LIVE_REDIS_URL', app.config['CACHE_REDIS_URL'])
+app.config['LIVE_MAX_CONNECTIONS'] = int(os.environ.get('LIVE_MAX_CONNECTIONS', 200))  # per process
+app.config['LIVE_MAX_PER_USER'] = int(os.environ.get('LIVE_MAX_PER_USER', 4))
+app.config['LIVE_MAX_EVENTS'] = int(os.environ.get('LIVE_MAX_EVENTS', 50))  # events followed per stream
+app.config['LIVE_HEARTBEAT'] = int(os.environ.get('LIVE_HEARTBEAT', 15))  # seconds
+app.config['LIVE_MAX_AGE'] = int(os.environ.get('LIVE_MAX_AGE', 300))  # seconds before the client reconnects
+
+# Short-lived snapshot of the logged-in user (role, name, unread count) so
+# authenticated requests skip the user row lookup; 0 disables it. Other
+# workers keep their snapshot after a change, so this is also how long a
+# deactivated or demoted user can keep access there
+app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 5))
+app.config['IDENTITY_CACHE_MAX_ENTRIES'] = int(os.environ.get('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+
+# Dashboards read precomputed numbers from the stats_snapshot table when it
+# was refreshed (`flask --app main refresh-stats`) within this many seconds;
+# 0 always aggregates live
+app.config['STATS_SNAPSHOT_MAX_AGE'] = int(os.environ.get('STATS_SNAPSHOT_MAX_AGE', 0))
+
+# Event reminders go out when an event enters each window before its start
+# (`flask --app main send-reminders`); REMINDER_INTERVAL > 0 also sweeps
+# from a timer thread in the web process
+app.config['REMINDER_WINDOWS'] = os.environ.get('REMINDER_WINDOWS', '24h,1h')
+app.config['REMINDER_INTERVAL'] = int(os.environ.get('REMINDER_INTERVAL', 0))
+
+# Notification retention (`flask --app main prune-notifications`): read
+# notifications are deleted after NOTIFICATION_DELETE_READ_DAYS, anything
+# older than NOTIFICATION_ARCHIVE_DAYS moves to notification_archive; 0
+# turns a policy off. Sweeps work in short batches to keep locks brief
+app.config['NOTIFICATION_DELETE_READ_DAYS'] = int(os.environ.get('NOTIFICATION_DELETE_READ_DAYS', 90))
+app.config['NOTIFICATION_ARCHIVE_DAYS'] = int(os.environ.get('NOTIFICATION_ARCHIVE_DAYS', 365))
+app.config['RETENTION_BATCH_SIZE'] = int(os.environ.get('RETENTION_BATCH_SIZE', 1000))
+app.config['RETENTION_BATCH_PAUSE'] = float(os.environ.get('RETENTION_BATCH_PAUSE', 0.05))  # seconds
+
+# Request instrumentation: statements slower than this are logged with the
+# route that ran them. /metrics is served only with METRICS_TOKEN set, to
+# clients sending it as a bearer token
+app.config['SLOW_QUERY_SECONDS'] = float(os.environ.get('SLOW_QUERY_SECONDS', 0.5))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# Create missing tables and apply migrations when the app is imported. Off
+# on serverless hosts: run `flask --app main db-upgrade` as a deploy step
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', 'false' if SERVERLESS else 'true').lower() == 'true'
+
+# Background job queue. Each web process runs JOB_WORKER_THREADS workers of
+# its own unless set to 0 for a separate `flask --app main run-worker`.
+# Serverless hosts cannot keep threads alive, so jobs run inline there
+app.config['JOB_QUEUE_EAGER'] = os.environ.get('JOB_QUEUE_EAGER', 'true' if SERVERLESS else 'false').lower() == 'true'
+app.config['JOB_WORKER_THREADS'] = int(os.environ.get('JOB_WORKER_THREADS', 1))
+app.config['JOB_RETRY_BASE_SECONDS'] = int(os.environ.get('JOB_RETRY_BASE_SECONDS', 30))
+app.config['JOB_LOCK_TIMEOUT'] = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))
 
 # Initialize extensions
 db.init_app(app)
@@ -44,10 +138,14 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
-mail.init_app(app)
+replicas.init_app(app)
+# Flask-Mail is set up on first use by mailer.get_mail()
+
+# Import models to ensure they are registered
+import models  # noqa: F401
 
-with app.app_context():
-    # Import models to ensure they are registered
-    import models  # noqa: F401
-    db.create_all()
-    logging.info("Database tables created")
+if app.config['AUTO_MIGRATE']:
+    with app.app_context():
+        from migrations import run_migrations
+        run_migrations()
+        logging.info("Database tables created")
@@ -0,0 +1,489 @@
+"""Load and latency benchmark for the Flask routes
+
+Seeds a synthetic dataset into a scratch database, then drives the app
+through the Flask test client (sequential, with SQL query counts) and an
+HTTP load generator (concurrent), and reports p50/p95/p99 latency and
+throughput per route. Results can be saved as a baseline and compared
+against it; a regression exits non-zero. Every run also checks each
+route's SQL statement count against QUERY_BUDGETS, which do not depend on
+the dataset size, so an N+1 query fails the run on any dataset.
+
+    python benchmark.py --users 2000 --events 500 --save-baseline
+    python benchmark.py --users 2000 --events 500   # compares with the baseline
+    python benchmark.py --requests 3 --concurrency 0   # query budgets only
+
+Never point --database at a database you care about: it is wiped first.
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import multiprocessing
+import tempfile
+import threading
+import statistics
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import build_opener, HTTPCookieProcessor
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+PASSWORD = 'benchmark'
+CATEGORIES = ['academic', 'cultural', 'sports', 'technical', 'social', 'workshop', 'seminar', 'competition', 'other']
+SEARCH_TERMS = ['robotics', 'music', 'hackathon', 'football', 'seminar']
+
+# Most SQL statements (BEGIN/COMMIT excluded) one request to a route may
+# issue, whatever the page size or dataset; raise one only deliberately
+QUERY_BUDGETS = {
+    'GET /': 1,
+    'GET /events': 3,
+    'GET /events?search': 3,
+    'GET /event/<id>': 3,
+    'GET /api/calendar': 2,
+    'GET /student_dashboard': 4,
+    'GET /notifications': 4,
+    'GET /api/notifications': 2,
+    'POST /register_event': 7,
+    'POST /cancel_registration': 7,
+    'GET /organizer_dashboard': 6,
+    'GET /event_registrations/<id>': 5,
+    'GET /admin_dashboard': 4,
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='Database URL to seed (default: a temporary SQLite file)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--registrations', type=int, default=10, help='Registrations per student')
+    parser.add_argument('--notifications', type=int, default=20, help='Notifications per user')
+    parser.add_argument('--requests', type=int, default=50, help='Iterations per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='HTTP load generator threads (0 skips it)')
+    parser.add_argument('--cache', action='store_true', help='Keep the page cache on (off by default)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 slowdown vs. baseline')
+    parser.add_argument('--output', help='Also write the results as JSON to this path')
+    parser.add_argument('--contention', type=int, default=0, metavar='PROCESSES',
+                        help='Instead, compare SQLite write contention across processes with the '
+                             'SQLite profile off and on')
+    return parser.parse_args(argv)
+
+def configure_environment(args):
+    """Point the app at the scratch database before it is imported"""
+    if not args.database:
+        path = os.path.join(tempfile.mkdtemp(prefix='festagram-bench-'), 'bench.db')
+        args.database = f'sqlite:///{path}'
+    os.environ['DATABASE_URL'] = args.database
+    os.environ['JOB_QUEUE_EAGER'] = 'false'
+    os.environ['JOB_WORKER_THREADS'] = '0'
+    os.environ['MAIL_ENABLED'] = 'false'
+    os.environ['MAIL_USERNAME'] = ''
+    if not args.cache:
+        os.environ['CACHE_TYPE'] = 'null'
+    else:
+        # Never reuse pages cached from another database
+        os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='festagram-bench-cache-')
+
+def seed(args):
+    """Wipe the database and fill it with a reproducible synthetic dataset"""
+    from sqlalchemy import insert, func, update
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from models import User, Event, EventRegistration, Notification
+    from migrations import run_migrations
+
+    rng = random.Random(args.seed)
+    db.drop_all(bind_key=None)
+    run_migrations()
+
+    # One hash for everyone; hashing per user would dominate seeding
+    password_hash = generate_password_hash(PASSWORD)
+    users = [dict(username='admin0', email='admin0@bench.edu', first_name='Admin', last_name='Bench',
+                  role='admin', password_hash=password_hash)]
+    organizers = max(1, args.users // 50)
+    for i in range(organizers):
+        users.append(dict(username=f'organizer{i}', email=f'organizer{i}@bench.edu', first_name='Organizer',
+                          last_name=str(i), role='organizer', password_hash=password_hash))
+    for i in range(args.users):
+        users.append(dict(username=f'student{i}', email=f'student{i}@bench.edu', first_name='Student',
+                          last_name=str(i), role='student', student_id=f'B{i:07d}',
+                          department=rng.choice(['CS', 'EE', 'ME', 'Arts']), year=rng.randint(1, 4),
+                          password_hash=password_hash))
+    db.session.execute(insert(User), users)
+    organizer_ids = [row[0] for row in db.session.query(User.id).filter(User.role == 'organizer')]
+    student_ids = [row[0] for row in db.session.query(User.id).filter(User.role == 'student')]
+
+    now = datetime.utcnow()
+    events = []
+    for i in range(args.events):
+        # Four years of history plus a season ahead
+        start = now + timedelta(days=rng.randint(-4 * 365, 120), hours=rng.randint(8, 20))
+        term = rng.choice(SEARCH_TERMS)
+        events.append(dict(
+            title=f'{term.title()} {rng.choice(["Meetup", "Night", "Cup", "Workshop", "Talk"])} {i}',
+            description=f'A {term} event for students. ' * 5,
+            category=rng.choice(CATEGORIES), location=f'Building {rng.randint(1, 20)}',
+            start_datetime=start, end_datetime=start + timedelta(hours=rng.randint(1, 4)),
+            registration_deadline=start - timedelta(days=1), capacity=rng.choice([30, 50, 100, 300]),
+            current_registrations=0, allow_waitlist=rng.random() < 0.7, is_active=rng.random() < 0.95,
+            created_by=rng.choice(organizer_ids), created_at=start - timedelta(days=30),
+            updated_at=start - timedelta(days=30)
+        ))
+    db.session.execute(insert(Event), events)
+    event_rows = db.session.query(Event.id, Event.capacity).all()
+
+    registrations = []
+    taken = defaultdict(int)
+    for user_id in student_ids:
+        for event_id, capacity in rng.sample(event_rows, min(args.registrations, len(event_rows))):
+            status = 'registered' if taken[event_id] < capacity else 'waitlisted'
+            if status == 'registered':
+                taken[event_id] += 1
+            registrations.append(dict(user_id=user_id, event_id=event_id, status=status,
+                                      registration_date=now - timedelta(minutes=rng.randint(0, 500000))))
+    for start in range(0, len(registrations), 5000):
+        db.session.execute(insert(EventRegistration), registrations[start:start + 5000])
+    for event_id, count in taken.items():
+        db.session.execute(update(Event).where(Event.id == event_id).values(current_registrations=count))
+
+    notifications = []
+    for user_id in student_ids:
+        for n in range(args.notifications):
+            notifications.append(dict(user_id=user_id, title=f'Notice {n}', message='Something happened.',
+                                      type='event_update', is_read=rng.random() < 0.6,
+                                      created_at=now - timedelta(minutes=rng.randint(0, 500000))))
+    for start in range(0, len(notifications), 5000):
+        db.session.execute(insert(Notification), notifications[start:start + 5000])
+    db.session.commit()
+
+    from utils import reconcile_unread_counts
+    from search import rebuild_search_index
+    reconcile_unread_counts()
+    rebuild_search_index()
+
+    upcoming = [row[0] for row in db.session.query(Event.id).filter(
+        Event.start_datetime > now, Event.is_active == True).order_by(Event.start_datetime)]
+    busiest = db.session.query(Event.id).order_by(Event.current_registrations.desc()).first()[0]
+    counts = {name: db.session.query(func.count(model.id)).scalar()
+              for name, model in (('users', User), ('events', Event),
+                                  ('registrations', EventRegistration), ('notifications', Notification))}
+    return {
+        'counts': counts,
+        'upcoming': upcoming,
+        'busiest_event': busiest,
+        'busiest_organizer': db.session.get(Event, busiest).creator.username,
+        'students': [f'student{i}' for i in range(min(args.users, 50))],
+    }
+
+def scenarios(dataset, rng):
+    """(name, role, method, path factory) for every benchmarked route"""
+    upcoming = dataset['upcoming'] or [dataset['busiest_event']]
+    today = datetime.utcnow().date()
+    window = urlencode({'start': (today - timedelta(days=35)).isoformat(),
+                        'end': (today + timedelta(days=42)).isoformat()})
+    return [
+        ('GET /', None, 'GET', lambda: '/'),
+        ('GET /events', None, 'GET', lambda: f'/events?page={rng.randint(1, 3)}'),
+        ('GET /events?search', None, 'GET', lambda: '/events?' + urlencode({'search': rng.choice(SEARCH_TERMS)})),
+        ('GET /event/<id>', None, 'GET', lambda: f'/event/{rng.choice(upcoming)}'),
+        ('GET /api/calendar', None, 'GET', lambda: f'/api/calendar?{window}'),
+        ('GET /student_dashboard', 'student', 'GET', lambda: '/student_dashboard'),
+        ('GET /notifications', 'student', 'GET', lambda: '/notifications'),
+        ('GET /api/notifications', 'student', 'GET', lambda: '/api/notifications'),
+        ('POST /register_event', 'student', 'POST', lambda: f'/register_event/{upcoming[0]}'),
+        ('POST /cancel_registration', 'student', 'POST', lambda: f'/cancel_registration/{upcoming[0]}'),
+        ('GET /organizer_dashboard', 'organizer', 'GET', lambda: '/organizer_dashboard'),
+        ('GET /event_registrations/<id>', 'organizer', 'GET',
+         lambda: f'/event_registrations/{dataset["busiest_event"]}'),
+        ('GET /admin_dashboard', 'admin', 'GET', lambda: '/admin_dashboard'),
+    ]
+
+def usernames(dataset, worker):
+    students = dataset['students']
+    return {'student': students[worker % len(students)], 'organizer': dataset['busiest_organizer'], 'admin': 'admin0'}
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles in milliseconds for a list of durations in seconds"""
+    ms = sorted(sample * 1000 for sample in samples)
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    summary = {'requests': len(ms), 'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+    if elapsed:
+        summary['rps'] = round(len(ms) / elapsed, 1)
+    return summary
+
+def run_test_client(app, dataset, args):
+    """Sequential pass through the test client, counting SQL statements"""
+    from sqlalchemy import event
+    from app import db
+    from metrics import is_query
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        engine = db.engine
+    statements = [0]
+
+    def count(conn, cursor, statement, *_):
+        if is_query(statement):
+            statements[0] += 1
+
+    clients = {}
+    for role, username in usernames(dataset, 0).items():
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        clients[role] = client
+    clients[None] = app.test_client()
+
+    plan = scenarios(dataset, rng)
+    timings = defaultdict(list)
+    queries = defaultdict(list)
+    errors = defaultdict(int)
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(args.requests):
+            for name, role, method, path in plan:
+                url = path()
+                statements[0] = 0
+                started = time.perf_counter()
+                response = clients[role].open(url, method=method)
+                timings[name].append(time.perf_counter() - started)
+                queries[name].append(statements[0])
+                if response.status_code >= 400:
+                    errors[name] += 1
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    results = {}
+    for name, *_ in plan:
+        results[name] = summarize(timings[name])
+        results[name]['queries'] = max(queries[name])
+        results[name]['errors'] = errors[name]
+    return results
+
+def run_http(app, dataset, args):
+    """Concurrent load against a threaded local server over real HTTP"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(number):
+        rng = random.Random(args.seed + number)
+        openers = {None: build_opener(HTTPCookieProcessor(CookieJar()))}
+        for role, username in usernames(dataset, number).items():
+            opener = build_opener(HTTPCookieProcessor(CookieJar()))
+            opener.open(base + '/login', urlencode({'username': username, 'password': PASSWORD}).encode()).read()
+            openers[role] = opener
+        plan = scenarios(dataset, rng)
+        for _ in range(args.requests):
+            for name, role, method, path in plan:
+                data = b'' if method == 'POST' else None
+                started = time.perf_counter()
+                failed = False
+                try:
+                    openers[role].open(base + path(), data).read()
+                except HTTPError:
+                    failed = True
+                elapsed = time.perf_counter() - started
+                with lock:
+                    timings[name].append(elapsed)
+                    errors[name] += failed
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(worker, range(args.concurrency)))
+    finally:
+        server.shutdown()
+    elapsed = time.perf_counter() - started
+
+    results = {name: summarize(samples) for name, samples in timings.items()}
+    for name in results:
+        results[name]['errors'] = errors[name]
+    total = sum(len(samples) for samples in timings.values())
+    results['_total'] = {'requests': total, 'rps': round(total / elapsed, 1)}
+    return results
+
+def contention_worker(database, profile, username, iterations, event_id, start_at):
+    """One process registering, cancelling, reading and logging in in a loop
+
+    Returns (login timings, other timings, server errors).
+    """
+    os.environ['DATABASE_URL'] = database
+    os.environ['SQLITE_PROFILE'] = 'true' if profile else 'false'
+    os.environ['CACHE_TYPE'] = 'null'
+    os.environ['IDENTITY_CACHE_TTL'] = '0'
+    import logging
+    logging.disable(logging.CRITICAL)
+    from main import app
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    # Password hashing must not hold the write lock other processes wait on
+    guest = app.test_client()
+    while time.time() < start_at:
+        time.sleep(0.001)
+    logins = []
+    timings = []
+    errors = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = guest.post('/login', data={'username': username, 'password': PASSWORD})
+        logins.append(time.perf_counter() - started)
+        errors += response.status_code >= 500
+        guest.get('/logout')
+        for method, url in (('POST', f'/register_event/{event_id}'), ('GET', '/student_dashboard'),
+                            ('POST', f'/cancel_registration/{event_id}'), ('GET', '/notifications')):
+            started = time.perf_counter()
+            response = client.open(url, method=method)
+            timings.append(time.perf_counter() - started)
+            errors += response.status_code >= 500
+    return logins, timings, errors
+
+def run_contention(app, dataset, args):
+    """Run the same multi-process write load with the SQLite profile off and on"""
+    from app import db
+    with app.app_context():
+        # Release the seeding connections; switching journal mode needs the lock
+        db.engine.dispose()
+    path = args.database.split('///', 1)[1]
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for profile in (False, True):
+        connection = sqlite3.connect(path)
+        connection.execute('PRAGMA journal_mode = WAL' if profile else 'PRAGMA journal_mode = DELETE')
+        connection.close()
+        start_at = time.time() + 3
+        jobs = [(args.database, profile, dataset['students'][i % len(dataset['students'])],
+                 args.requests, dataset['upcoming'][0], start_at) for i in range(args.contention)]
+        with context.Pool(args.contention) as pool:
+            outcomes = pool.starmap(contention_worker, jobs)
+        elapsed = time.time() - start_at
+        samples = [timing for _, timings, _ in outcomes for timing in timings]
+        logins = [timing for timings, _, _ in outcomes for timing in timings]
+        name = 'profile on' if profile else 'profile off'
+        results[name] = summarize(samples + logins, elapsed)
+        results[name]['errors'] = sum(errors for _, _, errors in outcomes)
+        results[f'{name}: POST /login'] = summarize(logins)
+        results[f'{name}: POST /login']['errors'] = 0
+    return results
+
+def print_table(title, results):
+    print(f'\n{title}')
+    print(f'{"route":<34}{"n":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"errors":>8}')
+    for name, row in results.items():
+        if name.startswith('_'):
+            continue
+        print(f'{name:<34}{row["requests"]:>6}{row["p50_ms"]:>10.2f}{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}'
+              f'{row.get("queries", ""):>9}{row["errors"]:>8}')
+    if '_total' in results:
+        print(f'total: {results["_total"]["requests"]} requests, {results["_total"]["rps"]} req/s')
+
+def check_query_budgets(results):
+    """List routes whose worst request issued more SQL than QUERY_BUDGETS allows"""
+    problems = []
+    for name, row in results.items():
+        budget = QUERY_BUDGETS.get(name)
+        if budget is None:
+            problems.append(f'{name}: no query budget in QUERY_BUDGETS')
+        elif row['queries'] > budget:
+            problems.append(f'{name}: {row["queries"]} queries per request, budget {budget}')
+    return problems
+
+def compare(results, baseline, tolerance):
+    """List regressions: more SQL per request, errors, or a slower p95"""
+    problems = []
+    if baseline.get('dataset') != results['dataset']:
+        problems.append('dataset differs from the baseline; rerun with the same sizes and --seed')
+        return problems
+    for mode in ('test_client', 'http'):
+        for name, row in results.get(mode, {}).items():
+            before = baseline.get(mode, {}).get(name)
+            if not before or name.startswith('_'):
+                continue
+            if row.get('queries', 0) > before.get('queries', 0):
+                problems.append(f'{mode} {name}: {before["queries"]} -> {row["queries"]} queries per request')
+            if row['errors'] > before['errors']:
+                problems.append(f'{mode} {name}: {before["errors"]} -> {row["errors"]} errors')
+            if row['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                problems.append(f'{mode} {name}: p95 {before["p95_ms"]:.2f} -> {row["p95_ms"]:.2f} ms')
+    return problems
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+
+    import logging
+    logging.disable(logging.INFO)
+    from main import app
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        started = time.perf_counter()
+        dataset = seed(args)
+    print(f'Seeded {dataset["counts"]} into {args.database} in {time.perf_counter() - started:.1f}s')
+
+    if args.contention:
+        if not args.database.startswith('sqlite:///'):
+            print('--contention needs a file-backed SQLite database')
+            return 2
+        results = run_contention(app, dataset, args)
+        print_table(f'SQLite contention ({args.contention} processes)', results)
+        for name, row in results.items():
+            if 'rps' in row:
+                print(f'{name}: {row["rps"]} req/s, {row["errors"]} server errors')
+        return 0
+
+    results = {
+        'dataset': {key: getattr(args, key) for key in ('users', 'events', 'registrations', 'notifications', 'requests', 'seed', 'cache')},
+        'database': args.database.split(':', 1)[0],
+        'test_client': run_test_client(app, dataset, args),
+    }
+    print_table('Test client (sequential)', results['test_client'])
+    over_budget = check_query_budgets(results['test_client'])
+    if over_budget:
+        print('\nOVER QUERY BUDGET:')
+        for problem in over_budget:
+            print(f'  {problem}')
+    if args.concurrency:
+        results['http'] = run_http(app, dataset, args)
+        print_table(f'HTTP ({args.concurrency} concurrent clients)', results['http'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nBaseline saved to {args.baseline}')
+        return 1 if over_budget else 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print('\nREGRESSIONS against baseline:')
+            for problem in problems:
+                print(f'  {problem}')
+            return 1
+        print(f'\nNo regressions against {args.baseline}')
+    return 1 if over_budget else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import os
+import time
+import uuid
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, session, jsonify
+from flask_login import current_user, login_required
+from app import app
+
+# Page cache for public views. Entries are keyed on path + query args plus
+# the current version of each tag the page depends on ('events',
+# 'event:<id>'); invalidating a tag bumps its version, so every page built
+# from the old data simply stops being looked up and ages out.
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL and a size bound"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+class FileSystemCache:
+    """Pickle-per-entry cache shared by every worker on one host"""
+
+    def __init__(self, directory, max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires_at, value), f)
+        os.replace(tmp_path, self._path(key))
+        self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _prune(self):
+        names = [name for name in os.listdir(self.directory) if not name.endswith('.tmp')]
+        if len(names) <= self.max_entries:
+            return
+        paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class RedisCache:
+    """Redis-backed cache; any server speaking the Redis protocol will do"""
+
+    def __init__(self, url, prefix='festagram:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+def create_cache(config):
+    """Build the cache backend selected by CACHE_TYPE"""
+    cache_type = config['CACHE_TYPE']
+    if cache_type == 'memory':
+        return MemoryCache(config['CACHE_MAX_ENTRIES'])
+    if cache_type == 'filesystem':
+        return FileSystemCache(config['CACHE_DIR'], config['CACHE_MAX_ENTRIES'])
+    if cache_type == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'])
+    return NullCache()
+
+page_cache = create_cache(app.config)
+stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+stats_lock = threading.Lock()
+
+def _count(name):
+    with stats_lock:
+        stats[name] += 1
+
+def tag_version(tag):
+    """Current version of a cache tag, created on first use"""
+    version = page_cache.get(f'tag:{tag}')
+    if version is None:
+        version = uuid.uuid4().hex
+        page_cache.set(f'tag:{tag}', version)
+    return version
+
+def invalidate(*tags):
+    """Drop every cached page that depends on any of the tags"""
+    for tag in tags:
+        page_cache.set(f'tag:{tag}', uuid.uuid4().hex)
+        _count('invalidations')
+
+def invalidate_event(event_id=None):
+    """Invalidate event listings and, if given, one event's detail page"""
+    if event_id is None:
+        invalidate('events')
+    else:
+        invalidate('events', f'event:{event_id}')
+
+def cached_page(*tags, anonymous_only=True):
+    """Cache a GET view's response, keyed on path, query args and tags
+
+    Tags may use view-argument placeholders, e.g. 'event:{id}'. With
+    anonymous_only, logged-in users and requests carrying flashed messages
+    always get a fresh render.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or (anonymous_only and (
+                    current_user.is_authenticated or '_flashes' in session)):
+                return view(*args, **kwargs)
+
+            resolved = [tag.format(**kwargs) for tag in tags]
+            query = urlencode(sorted(request.args.items(multi=True)))
+            versions = ','.join(tag_version(tag) for tag in resolved)
+            key = f'page:{request.path}?{query}|{versions}'
+
+            entry = page_cache.get(key)
+            if entry is not None:
+                _count('hits')
+                body, status, headers = entry
+                response = app.response_class(body, status=status, headers=headers)
+                return response.make_conditional(request)
+
+            _count('misses')
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                headers = [(name, value) for name, value in response.headers
+                           if name.lower() in ('content-type', 'etag', 'last-modified', 'cache-control')]
+                page_cache.set(key, (response.get_data(), 200, headers), app.config['CACHE_DEFAULT_TTL'])
+            return response
+        return wrapper
+    return decorator
+
+@app.route('/api/cache_stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin():
+        return jsonify(error='Admin privileges required.'), 403
+    with stats_lock:
+        snapshot = dict(stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_ratio'] = round(snapshot['hits'] / lookups, 3) if lookups else None
+    snapshot['backend'] = app.config['CACHE_TYPE']
+    return jsonify(snapshot)
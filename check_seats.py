@@ -0,0 +1,186 @@
+"""Concurrency check for seat claims: registrations must never oversell
+
+Seeds one event with a waitlist and one without into a scratch database,
+then races registrations (including duplicate attempts by the same user)
+and cancellations from several processes with several threads each.
+Afterwards every event's current_registrations must equal its number of
+'registered' rows and stay within capacity, no user may hold two
+registrations for one event, and every freed seat must have gone to the
+waitlist. Exits 1 on any violation.
+
+    python check_seats.py --processes 4 --threads 8 --users 400 --capacity 50
+
+Never point --database at a database you care about: it is wiped first.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='Database URL to seed (default: a temporary SQLite file)')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per process')
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--capacity', type=int, default=50)
+    parser.add_argument('--duplicates', type=float, default=0.2, help='Share of users who try to register twice')
+    parser.add_argument('--cancellations', type=float, default=0.25, help='Share of users who cancel afterwards')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+def configure_environment(database):
+    os.environ['DATABASE_URL'] = database
+    os.environ['CACHE_TYPE'] = 'null'
+    os.environ['JOB_QUEUE_EAGER'] = 'false'
+    os.environ['MAIL_ENABLED'] = 'false'
+    os.environ['MAIL_USERNAME'] = ''
+    os.environ['LIVE_ENABLED'] = 'false'
+    os.environ['LOG_LEVEL'] = 'WARNING'
+
+def seed(args):
+    """Wipe the database and create the users and the two contested events"""
+    from sqlalchemy import insert
+    from app import db
+    from models import User, Event
+    from migrations import run_migrations
+
+    db.drop_all(bind_key=None)
+    run_migrations()
+    db.session.execute(insert(User), [
+        dict(username=f'racer{i}', email=f'racer{i}@check.edu', first_name='Racer', last_name=str(i),
+             role='student', password_hash='-')
+        for i in range(args.users)
+    ])
+    now = datetime.utcnow()
+    event_ids = {}
+    for allow_waitlist in (True, False):
+        event = Event(title=f'Contested ({"waitlist" if allow_waitlist else "no waitlist"})',
+                      description='Seat race', category='other', location='Hall',
+                      start_datetime=now + timedelta(days=2), end_datetime=now + timedelta(days=2, hours=2),
+                      registration_deadline=now + timedelta(days=1), capacity=args.capacity,
+                      allow_waitlist=allow_waitlist, created_by=1)
+        db.session.add(event)
+        db.session.flush()
+        event_ids[allow_waitlist] = event.id
+    db.session.commit()
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+    return user_ids, event_ids
+
+def attempt(action, event_id, user_id):
+    """Run one registration call, retrying when SQLite reports a lock"""
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from models import Event
+
+    for _ in range(100):
+        try:
+            return action(db.session.get(Event, event_id), user_id)
+        except OperationalError:
+            db.session.rollback()
+            time.sleep(random.random() / 100)
+    return 'gave up'
+
+def race_worker(database, phase, jobs, threads, start_at):
+    """One process working through (event id, user id) jobs on a thread pool"""
+    configure_environment(database)
+    from main import app
+    from registrations import register_for_event, cancel_event_registration
+
+    action = register_for_event if phase == 'register' else cancel_event_registration
+
+    def run(job):
+        with app.app_context():
+            return str(attempt(action, *job))
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return Counter(executor.map(run, jobs))
+
+def race(args, phase, jobs):
+    """Split jobs across processes that all start at the same moment"""
+    context = multiprocessing.get_context('spawn')
+    start_at = time.time() + 3
+    chunks = [jobs[i::args.processes] for i in range(args.processes)]
+    with context.Pool(args.processes) as pool:
+        outcomes = pool.starmap(race_worker, [(args.database, phase, chunk, args.threads, start_at)
+                                              for chunk in chunks])
+    return sum(outcomes, Counter())
+
+def check(args, event_ids, cancelled):
+    """Return a list of violated invariants"""
+    from sqlalchemy import select, func
+    from app import db
+    from models import Event, EventRegistration
+
+    problems = []
+    duplicates = db.session.execute(
+        select(EventRegistration.event_id, EventRegistration.user_id)
+        .group_by(EventRegistration.event_id, EventRegistration.user_id)
+        .having(func.count() > 1)
+    ).all()
+    if duplicates:
+        problems.append(f'{len(duplicates)} users hold more than one registration for an event')
+    for allow_waitlist, event_id in event_ids.items():
+        event = db.session.get(Event, event_id)
+        statuses = dict(db.session.execute(
+            select(EventRegistration.status, func.count())
+            .where(EventRegistration.event_id == event_id)
+            .group_by(EventRegistration.status)
+        ).all())
+        registered = statuses.get('registered', 0)
+        waitlisted = statuses.get('waitlisted', 0)
+        print(f'{event.title}: counter {event.current_registrations}, {registered} registered, '
+              f'{waitlisted} waitlisted, capacity {event.capacity}')
+        if event.current_registrations != registered:
+            problems.append(f'{event.title}: counter {event.current_registrations} != {registered} registered rows')
+        if registered > event.capacity:
+            problems.append(f'{event.title}: oversold, {registered} registered for {event.capacity} seats')
+        if waitlisted and not allow_waitlist:
+            problems.append(f'{event.title}: {waitlisted} waitlisted although the event has no waitlist')
+        # Demand exceeds capacity even after cancellations, so no seat may stay empty
+        if allow_waitlist and args.users - cancelled > event.capacity and registered < event.capacity:
+            problems.append(f'{event.title}: {event.capacity - registered} seats left empty with a waitlist')
+    return problems
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.database:
+        args.database = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='festagram-seats-'), 'seats.db')}"
+    configure_environment(args.database)
+    from main import app
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        user_ids, event_ids = seed(args)
+        from app import db
+        db.engine.dispose()
+
+    registrations = [(event_id, user_id) for event_id in event_ids.values() for user_id in user_ids]
+    registrations += rng.sample(registrations, int(len(registrations) * args.duplicates))
+    rng.shuffle(registrations)
+    print(f'register: {dict(race(args, "register", registrations))}')
+
+    cancelling = rng.sample(user_ids, int(len(user_ids) * args.cancellations))
+    cancellations = [(event_ids[True], user_id) for user_id in cancelling]
+    print(f'cancel:   {dict(race(args, "cancel", cancellations))}')
+
+    with app.app_context():
+        problems = check(args, event_ids, len(cancelling))
+    if problems:
+        print('\nSEAT INVARIANTS VIOLATED:')
+        for problem in problems:
+            print(f'  {problem}')
+        return 1
+    print('ok: no overselling')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
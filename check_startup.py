@@ -0,0 +1,96 @@
+"""Import-time budget for the serverless entry point
+
+Imports api/index.py in fresh interpreters under `python -X importtime`,
+the way a Vercel cold start does, and fails if the app's own startup
+(everything after the Flask/SQLAlchemy/WTForms libraries themselves) goes
+over budget or if a module meant to load on demand is imported eagerly.
+
+    python check_startup.py                  # exits 1 over budget
+    python check_startup.py --budget-ms 150 --runs 9
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Third-party libraries the app cannot start without; their import cost is
+# reported but not budgeted, since it depends on the versions installed
+LIBRARIES = ['flask', 'flask_sqlalchemy', 'flask_login', 'flask_wtf', 'wtforms', 'sqlalchemy', 'email_validator']
+
+# Loaded on first use (CLI commands, admin uploads, exports, email
+# delivery, schema migrations); importing one at startup is a regression
+DEFERRED = ['imports', 'exports', 'retention', 'migrations', 'flask_mail', 'concurrent.futures.process']
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=180.0, help='Median app import budget')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Slowest app modules to list')
+    return parser.parse_args(argv)
+
+def measure_once():
+    """Return ({top-level module: cumulative us}, {module: self us}) for one cold import"""
+    env = dict(os.environ)
+    env.update({
+        'VERCEL': '1',
+        'AUTO_MIGRATE': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.gettempdir(), 'festagram-startup.db')}",
+    })
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    code = f"import sys; sys.path.insert(0, 'api'); import {', '.join(LIBRARIES)}; import index"
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                             capture_output=True, text=True)
+    if process.returncode:
+        raise SystemExit(f'Importing the app failed:\n{process.stderr}')
+    top_level = {}
+    modules = {}
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules[name] = int(self_us)
+        if len(indent) == 1:
+            top_level[name] = top_level.get(name, 0) + int(cumulative_us)
+    return top_level, modules
+
+def main(argv=None):
+    args = parse_args(argv)
+    library_ms = []
+    app_ms = []
+    modules = {}
+    for _ in range(args.runs):
+        top_level, modules = measure_once()
+        library_ms.append(sum(top_level.get(name, 0) for name in LIBRARIES) / 1000)
+        app_ms.append(top_level['index'] / 1000)
+
+    app_median = statistics.median(app_ms)
+    print(f'libraries: {statistics.median(library_ms):.0f} ms (median of {args.runs}, not budgeted)')
+    print(f'app:       {app_median:.0f} ms (budget {args.budget_ms:.0f} ms)')
+
+    own = sorted(((us, name) for name, us in modules.items()
+                  if os.path.exists(os.path.join(ROOT, f'{name}.py'))), reverse=True)
+    print(f'\nslowest app modules (self time, last run):')
+    for us, name in own[:args.top]:
+        print(f'  {name:<20}{us / 1000:>8.1f} ms')
+
+    problems = [f'{name} is imported at startup' for name in DEFERRED if name in modules]
+    if app_median > args.budget_ms:
+        problems.append(f'app import takes {app_median:.0f} ms, over the {args.budget_ms:.0f} ms budget')
+    if problems:
+        print('\nSTARTUP REGRESSIONS:')
+        for problem in problems:
+            print(f'  {problem}')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
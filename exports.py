@@ -0,0 +1,159 @@
+import io
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+from sqlalchemy import select
+from app import db
+from models import User, EventRegistration
+
+# Registration exports are streamed: rows are fetched in yield_per batches
+# (a server-side cursor on Postgres) and encoded chunk by chunk, so memory
+# use stays flat however large the event is.
+
+EXPORT_BATCH_SIZE = 1000
+
+# Column key -> (header, SQL expression), in export order
+EXPORT_COLUMNS = {
+    'first_name': ('First Name', User.first_name),
+    'last_name': ('Last Name', User.last_name),
+    'username': ('Username', User.username),
+    'email': ('Email', User.email),
+    'student_id': ('Student ID', User.student_id),
+    'department': ('Department', User.department),
+    'year': ('Year', User.year),
+    'phone': ('Phone', User.phone),
+    'status': ('Status', EventRegistration.status),
+    'registration_date': ('Registration Date', EventRegistration.registration_date),
+}
+
+DEFAULT_EXPORT_COLUMNS = ['first_name', 'last_name', 'email', 'student_id', 'department', 'status', 'registration_date']
+
+def parse_export_columns(requested):
+    """Keep known column keys in the order given; fall back to the defaults"""
+    columns = [key for key in requested if key in EXPORT_COLUMNS]
+    return list(dict.fromkeys(columns)) or list(DEFAULT_EXPORT_COLUMNS)
+
+def iter_registration_rows(event_id, columns, statuses=None):
+    """Yield registration rows for an event, oldest first, in batches"""
+    statement = select(*(EXPORT_COLUMNS[key][1] for key in columns)).select_from(EventRegistration).join(
+        User, EventRegistration.user_id == User.id
+    ).where(EventRegistration.event_id == event_id)
+    if statuses:
+        statement = statement.where(EventRegistration.status.in_(statuses))
+    statement = statement.order_by(EventRegistration.registration_date, EventRegistration.id)
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+def _cell_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M')
+    return value
+
+def _csv_value(value):
+    value = _cell_value(value)
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        # Keep spreadsheet apps from evaluating user-entered text as a
+        # formula. XLSX inline strings are never evaluated, so only CSV
+        # needs this
+        return "'" + value
+    return value
+
+def stream_csv(columns, rows):
+    """Encode rows as CSV, yielding one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([EXPORT_COLUMNS[key][0] for key in columns])
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+class _ChunkWriter:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Registrations" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        value = _cell_value(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+def stream_xlsx(columns, rows):
+    """Encode rows as a single-sheet XLSX workbook, yielding zip chunks
+
+    The workbook uses inline strings so the sheet can be written in one pass
+    without a shared-strings table, and needs no spreadsheet library.
+    """
+    output = _ChunkWriter()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        workbook.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        workbook.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        workbook.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield output.drain()
+
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(EXPORT_COLUMNS[key][0] for key in columns).encode())
+            for count, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row).encode())
+                if count % EXPORT_BATCH_SIZE == 0:
+                    yield output.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield output.drain()
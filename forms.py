@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, TextAreaField, PasswordField, SelectField, IntegerField, DateTimeField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange, ValidationError
 from wtforms.widgets import DateTimeLocalInput
@@ -109,3 +110,9 @@ class SearchForm(FlaskForm):
         ('other', 'Other')
     ])
     submit = SubmitField('Search')
+
+class BulkImportForm(FlaskForm):
+    file = FileField('CSV or JSON File', validators=[FileRequired(), FileAllowed(['csv', 'json'], 'Upload a .csv or .json file.')])
+    dry_run = BooleanField('Dry run (validate only)')
+    skip_invalid = BooleanField('Import valid rows even if some rows are invalid')
+    submit = SubmitField('Import')
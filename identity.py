@@ -0,0 +1,84 @@
+from flask_login import UserMixin
+from sqlalchemy import event
+from app import app, db
+from cache import MemoryCache
+from models import User
+
+# The login manager used to load the full User row on every authenticated
+# request. Instead it gets a CachedIdentity built from a short-lived
+# snapshot; the row itself is only fetched when code touches an attribute
+# the snapshot doesn't carry (e.g. registrations) or assigns to one.
+#
+# The cache is per process: forget_identity() only clears this worker's
+# copy, so a role or is_active change reaches the other workers when their
+# snapshot expires. Keep IDENTITY_CACHE_TTL short for that reason.
+
+SNAPSHOT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'role', 'is_active', 'unread_count')
+
+identity_cache = MemoryCache(app.config['IDENTITY_CACHE_MAX_ENTRIES'])
+
+class CachedIdentity(UserMixin):
+    """Stand-in for current_user backed by a cached snapshot"""
+
+    def __init__(self, snapshot, user=None):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_user', user)
+
+    def _load(self):
+        if self._user is None:
+            object.__setattr__(self, '_user', db.session.get(User, self._snapshot['id']))
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._snapshot:
+            return self._snapshot[name]
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    @property
+    def is_active(self):
+        return bool(self._snapshot['is_active'])
+
+    def get_id(self):
+        return str(self._snapshot['id'])
+
+    def is_admin(self):
+        return self._snapshot['role'] == 'admin'
+
+    def is_organizer(self):
+        return self._snapshot['role'] == 'organizer'
+
+    def get_full_name(self):
+        return f"{self._snapshot['first_name']} {self._snapshot['last_name']}"
+
+    def __repr__(self):
+        return f"<User {self._snapshot['username']}>"
+
+def load_identity(user_id):
+    """Return the identity for a user id, hitting the database on a miss"""
+    ttl = app.config['IDENTITY_CACHE_TTL']
+    snapshot = identity_cache.get(user_id) if ttl else None
+    if snapshot is not None:
+        return CachedIdentity(snapshot)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    snapshot = {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+    if ttl:
+        identity_cache.set(user_id, snapshot, ttl)
+    return CachedIdentity(snapshot, user)
+
+def forget_identity(*user_ids):
+    """Drop cached snapshots so the next request reloads the users"""
+    for user_id in user_ids:
+        identity_cache.delete(user_id)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _forget_changed_user(mapper, connection, target):
+    forget_identity(target.id)
@@ -0,0 +1,314 @@
+import io
+import os
+import csv
+import json
+import time
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import click
+from sqlalchemy import insert, select
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import generate_password_hash
+from wtforms import IntegerField
+from wtforms.validators import Optional, NumberRange
+from app import app, db
+from models import User, Event
+from forms import EventForm, RegistrationForm
+
+# Bulk imports from CSV or JSON. Every row is validated with the same form
+# the web UI uses, then valid rows are inserted in executemany batches
+# inside a single transaction.
+
+IMPORT_BATCH_SIZE = 1000
+
+EVENT_IMPORT_FIELDS = ('title', 'description', 'category', 'start_datetime', 'end_datetime',
+                       'location', 'capacity', 'registration_deadline', 'allow_waitlist')
+
+USER_IMPORT_FIELDS = ('username', 'email', 'first_name', 'last_name', 'role', 'student_id',
+                      'phone', 'department', 'year', 'password')
+
+# Values checked against existing accounts, with the sign-up form's messages
+UNIQUE_USER_FIELDS = {
+    'username': 'Please use a different username.',
+    'email': 'Please use a different email address.',
+    'student_id': 'This student ID is already registered.',
+}
+
+# Chunk size for IN-lists, below SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+WELCOME_TITLE = "Welcome to Festagram!"
+WELCOME_MESSAGE = "Your account has been created successfully. Start exploring events and register for exciting activities."
+
+class RosterForm(RegistrationForm):
+    """Sign-up rules for one roster row, minus the per-row database lookups"""
+    password2 = None
+    year = IntegerField('Year of Study', validators=[Optional(), NumberRange(min=1, max=6)])
+    validate_username = None
+    validate_email = None
+    validate_student_id = None
+
+class ImportResult:
+    def __init__(self):
+        self.total = 0
+        self.created = 0
+        self.errors = []
+        self.elapsed = 0.0
+        self.hash_seconds = 0.0
+
+    @property
+    def valid(self):
+        return self.total - len(self.errors)
+
+    @property
+    def rate(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+def read_rows(stream, filename):
+    """Parse an uploaded CSV or JSON file into (line number, dict) pairs
+
+    JSON may be a list of objects or an object with a single list value.
+    Raises ValueError if the file can't be parsed or isn't UTF-8.
+    """
+    try:
+        if filename.lower().endswith('.json'):
+            data = json.load(stream)
+            if isinstance(data, dict):
+                data = next((value for value in data.values() if isinstance(value, list)), [])
+            return [(number, row) for number, row in enumerate(data, 1) if isinstance(row, dict)]
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        # Line 1 is the header
+        return list(enumerate(csv.DictReader(text), 2))
+    except UnicodeDecodeError:
+        # Typically an Excel export in the Windows code page
+        raise ValueError('the file is not UTF-8 encoded; save it as "CSV UTF-8" and upload it again')
+    except csv.Error as e:
+        raise ValueError(str(e))
+
+def _form_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'y' if value else ''
+    return str(value).strip()
+
+def _datetime_value(value):
+    # The form expects datetime-local input; accept a space separator and seconds too
+    return _form_value(value).replace(' ', 'T')[:16]
+
+def _flag_value(value):
+    value = _form_value(value).lower()
+    return '' if value in ('', '0', 'n', 'no', 'false', 'off') else 'y'
+
+def validate_event_row(row, form=None):
+    """Validate one import row with EventForm; returns (values, errors)
+
+    Pass a form from a previous call to reuse it; building the form is most
+    of the per-row cost.
+    """
+    formdata = MultiDict()
+    for field in EVENT_IMPORT_FIELDS:
+        value = row.get(field)
+        if field.endswith('datetime') or field == 'registration_deadline':
+            value = _datetime_value(value)
+        elif field == 'allow_waitlist':
+            value = _flag_value(value)
+        else:
+            value = _form_value(value)
+        formdata[field] = value
+    if form is None:
+        form = EventForm(formdata=formdata, meta={'csrf': False})
+    else:
+        form.process(formdata)
+    if not form.validate():
+        return None, [f"{field}: {message}" for field, messages in form.errors.items() for message in messages]
+    return {field: form[field].data for field in EVENT_IMPORT_FIELDS}, []
+
+def bulk_insert(model, rows):
+    """Insert row dicts in executemany batches; the caller commits"""
+    for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + IMPORT_BATCH_SIZE])
+
+def import_events(rows, created_by, dry_run=False, skip_invalid=False):
+    """Validate and insert events from (line number, dict) rows
+
+    Nothing is written if any row is invalid, unless skip_invalid is set.
+    """
+    from cache import invalidate_event
+
+    result = ImportResult()
+    started = time.perf_counter()
+    values = []
+    form = EventForm(formdata=MultiDict(), meta={'csrf': False})
+    for number, row in rows:
+        result.total += 1
+        event_values, errors = validate_event_row(row, form)
+        if errors:
+            result.errors.append((number, errors))
+        else:
+            values.append(dict(event_values, created_by=created_by))
+
+    if not dry_run and values and (skip_invalid or not result.errors):
+        try:
+            bulk_insert(Event, values)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        result.created = len(values)
+        invalidate_event()
+    result.elapsed = time.perf_counter() - started
+    logging.info(f"Event import: {result.created} created, {len(result.errors)} invalid of {result.total} rows")
+    return result
+
+def validate_user_row(row, form):
+    """Validate one roster row with RosterForm; returns (values, errors)"""
+    formdata = MultiDict()
+    for field in USER_IMPORT_FIELDS:
+        formdata[field] = _form_value(row.get(field))
+    if not formdata['role']:
+        formdata['role'] = 'student'
+    form.process(formdata)
+    if not form.validate():
+        return None, [f"{field}: {message}" for field, messages in form.errors.items() for message in messages]
+    values = {field: form[field].data for field in USER_IMPORT_FIELDS}
+    for field in ('student_id', 'phone', 'department'):
+        # Blank optional columns become NULL so unique student IDs don't collide on ''
+        values[field] = values[field] or None
+    return values, []
+
+def find_taken_values(column, values):
+    """Return which of the values already exist in a User column"""
+    values = list(values)
+    taken = set()
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        taken.update(db.session.execute(
+            select(column).where(column.in_(values[start:start + LOOKUP_BATCH_SIZE]))
+        ).scalars())
+    return taken
+
+def find_user_ids(usernames):
+    """Look up the ids of freshly inserted users by username"""
+    user_ids = []
+    for start in range(0, len(usernames), LOOKUP_BATCH_SIZE):
+        user_ids.extend(db.session.execute(
+            select(User.id).where(User.username.in_(usernames[start:start + LOOKUP_BATCH_SIZE]))
+        ).scalars())
+    return user_ids
+
+def hash_passwords(passwords, workers=None):
+    """Hash passwords in a process pool; workers=1 hashes in-process"""
+    if workers == 1 or len(passwords) < 2:
+        return [generate_password_hash(password) for password in passwords]
+    # Spawned, not forked: the caller may be a request handler with open
+    # database connections and other threads, which a fork would copy
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        chunksize = max(1, len(passwords) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(generate_password_hash, passwords, chunksize=chunksize))
+
+def import_users(rows, dry_run=False, skip_invalid=False, workers=None):
+    """Validate and create accounts from (line number, dict) roster rows
+
+    Uniqueness is checked for the whole batch with one query per unique
+    column. Passwords are hashed across a process pool, then users and their
+    welcome notifications are inserted in batches in one transaction.
+    """
+    from utils import bulk_create_notifications
+
+    result = ImportResult()
+    started = time.perf_counter()
+    form = RosterForm(formdata=MultiDict(), meta={'csrf': False})
+    parsed = []
+    for number, row in rows:
+        result.total += 1
+        values, errors = validate_user_row(row, form)
+        if errors:
+            result.errors.append((number, errors))
+        else:
+            parsed.append((number, values))
+
+    # Duplicates within the file and against existing accounts
+    row_errors = {}
+    for field, message in UNIQUE_USER_FIELDS.items():
+        seen = Counter(values[field] for number, values in parsed if values[field])
+        taken = find_taken_values(getattr(User, field), seen)
+        for number, values in parsed:
+            value = values[field]
+            if value in taken:
+                row_errors.setdefault(number, []).append(f"{field}: {message}")
+            elif value and seen[value] > 1:
+                row_errors.setdefault(number, []).append(f"{field}: Appears more than once in the file.")
+    result.errors.extend(row_errors.items())
+    result.errors.sort()
+    users = [values for number, values in parsed if number not in row_errors]
+
+    if not dry_run and users and (skip_invalid or not result.errors):
+        hash_started = time.perf_counter()
+        hashes = hash_passwords([values.pop('password') for values in users], workers)
+        result.hash_seconds = time.perf_counter() - hash_started
+        for values, password_hash in zip(users, hashes):
+            values['password_hash'] = password_hash
+        try:
+            bulk_insert(User, users)
+            user_ids = find_user_ids([values['username'] for values in users])
+            bulk_create_notifications(user_ids, WELCOME_TITLE, WELCOME_MESSAGE, 'welcome', commit=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        result.created = len(users)
+    result.elapsed = time.perf_counter() - started
+    logging.info(f"User import: {result.created} created, {len(result.errors)} invalid of {result.total} rows")
+    return result
+
+def echo_result(result, noun, max_errors=20):
+    """Print per-row errors and a throughput summary for a CLI import"""
+    for number, errors in result.errors[:max_errors]:
+        click.echo(f"  row {number}: {'; '.join(errors)}", err=True)
+    if len(result.errors) > max_errors:
+        click.echo(f"  ... and {len(result.errors) - max_errors} more invalid rows", err=True)
+    click.echo(f"{result.total} rows, {result.valid} valid, {result.created} {noun} created "
+               f"in {result.elapsed:.2f}s ({result.rate:.0f} rows/s)")
+
+@app.cli.command('import-events')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Username recorded as the events\' creator.')
+@click.option('--dry-run', is_flag=True, help='Validate only; write nothing.')
+@click.option('--skip-invalid', is_flag=True, help='Import the valid rows even if some rows are invalid.')
+def import_events_command(path, username, dry_run, skip_invalid):
+    """Bulk import events from a CSV or JSON file"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f"no user named {username}", param_hint='--user')
+    with open(path, 'rb') as stream:
+        try:
+            rows = read_rows(stream, path)
+        except ValueError as e:
+            raise click.ClickException(f"Could not read {path}: {e}")
+    result = import_events(rows, user.id, dry_run=dry_run, skip_invalid=skip_invalid)
+    echo_result(result, 'events')
+    if result.errors and not (dry_run or skip_invalid):
+        raise click.ClickException('No events imported because some rows are invalid (see --skip-invalid).')
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate only; write nothing.')
+@click.option('--skip-invalid', is_flag=True, help='Import the valid rows even if some rows are invalid.')
+@click.option('--workers', type=int, default=None, help='Password hashing processes (default: CPU count).')
+def import_users_command(path, dry_run, skip_invalid, workers):
+    """Bulk create accounts from a CSV or JSON roster"""
+    with open(path, 'rb') as stream:
+        try:
+            rows = read_rows(stream, path)
+        except ValueError as e:
+            raise click.ClickException(f"Could not read {path}: {e}")
+    result = import_users(rows, dry_run=dry_run, skip_invalid=skip_invalid, workers=workers)
+    echo_result(result, 'users')
+    if result.created:
+        click.echo(f"Hashed {result.created} passwords in {result.hash_seconds:.2f}s "
+                   f"({result.created / max(result.hash_seconds, 1e-6):.0f}/s)")
+    if result.errors and not (dry_run or skip_invalid):
+        raise click.ClickException('No users imported because some rows are invalid (see --skip-invalid).')
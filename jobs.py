@@ -0,0 +1,208 @@
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import click
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import Job
+from mailer import deliver_outbox
+
+# Registered task handlers, keyed by Job.name. A handler stages its database
+# work in db.session; the runner commits it together with the job status so
+# a retried job never applies its changes twice.
+TASKS = {}
+
+def task(name):
+    """Register a function as a background task handler"""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+def enqueue(name, idempotency_key=None, run_at=None, max_attempts=5, commit=True, **payload):
+    """Queue a task for the worker
+
+    With commit=False the job is staged in the caller's transaction, so it only
+    becomes visible if the caller's changes commit. Jobs sharing an
+    idempotency key are queued once; the existing job is returned instead.
+    In eager mode the task runs right away, and a keyed job is recorded as
+    done so the key still deduplicates.
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown task: {name}")
+
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+
+    if app.config['JOB_QUEUE_EAGER']:
+        TASKS[name](**payload)
+        job = None
+        if idempotency_key:
+            job = Job(name=name, payload=json.dumps(payload), idempotency_key=idempotency_key,
+                      status='done', attempts=1, max_attempts=max_attempts)
+            db.session.add(job)
+        if commit:
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Lost a race with another request running the same key
+                db.session.rollback()
+                return Job.query.filter_by(idempotency_key=idempotency_key).first()
+        return job
+
+    job = Job(
+        name=name,
+        payload=json.dumps(payload),
+        idempotency_key=idempotency_key,
+        run_at=run_at or datetime.utcnow(),
+        max_attempts=max_attempts
+    )
+    db.session.add(job)
+    if not commit:
+        return job
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Lost a race with another request enqueueing the same key
+        db.session.rollback()
+        return Job.query.filter_by(idempotency_key=idempotency_key).first()
+    logging.info(f"Job {job.id} queued: {name}")
+    return job
+
+def claim_next_job():
+    """Atomically mark the next due job as running and return it"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'])
+    due = or_(
+        and_(Job.status == 'pending', Job.run_at <= now),
+        and_(Job.status == 'running', Job.locked_at < stale)
+    )
+
+    for _ in range(5):
+        job_id = db.session.execute(
+            select(Job.id).where(due).order_by(Job.run_at, Job.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+
+        # Conditional update: only one worker wins a given job
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, due)
+            .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+def run_job(job):
+    """Execute a claimed job, scheduling a retry with backoff on failure"""
+    handler = TASKS.get(job.name)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown task: {job.name}")
+        handler(**json.loads(job.payload))
+        job.status = 'done'
+        job.last_error = None
+        job.locked_at = None
+        db.session.commit()
+        logging.info(f"Job {job.id} done: {job.name}")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = str(e)
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            logging.error(f"Job {job.id} failed permanently: {str(e)}")
+        else:
+            job.status = 'pending'
+            delay = app.config['JOB_RETRY_BASE_SECONDS'] * 2 ** (job.attempts - 1)
+            job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+            logging.warning(f"Job {job.id} failed, retrying in {delay}s: {str(e)}")
+        db.session.commit()
+        return False
+
+def work(burst=False, poll_interval=1.0):
+    """Process jobs until the queue is empty (burst) or forever"""
+    processed = 0
+    with app.app_context():
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if app.config['MAIL_ENABLED'] and deliver_outbox()[0]:
+                    continue
+                if burst:
+                    return processed
+                time.sleep(poll_interval)
+                continue
+            run_job(job)
+            processed += 1
+
+def start_job_threads(count, poll_interval=1.0):
+    """Run job workers on daemon threads in this process"""
+    def run():
+        while True:
+            try:
+                work(poll_interval=poll_interval)
+            except Exception as e:
+                logging.error(f"In-process job worker failed, restarting: {str(e)}")
+                time.sleep(poll_interval)
+    threads = [threading.Thread(target=run, name=f'job-worker-{i}', daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+_job_threads_lock = threading.Lock()
+_job_threads = None
+
+@app.before_request
+def ensure_job_threads():
+    global _job_threads
+    if _job_threads is not None or app.config['JOB_QUEUE_EAGER']:
+        return
+    with _job_threads_lock:
+        if _job_threads is not None:
+            return
+        count = app.config['JOB_WORKER_THREADS']
+        if count:
+            logging.info(f"Starting {count} in-process job worker threads")
+        else:
+            logging.warning("JOB_WORKER_THREADS is 0: queued jobs and emails wait for "
+                            "`flask --app main run-worker`; make sure one is running")
+        _job_threads = start_job_threads(count)
+
+@app.cli.command('run-worker')
+@click.option('--threads', default=1, show_default=True, help='Number of worker threads.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to sleep when idle.')
+def run_worker_command(threads, burst, poll_interval):
+    """Run background job workers"""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(work, burst, poll_interval) for _ in range(threads)]
+        processed = sum(future.result() for future in futures)
+    click.echo(f"Processed {processed} jobs")
+
+@task('notify_event_update')
+def notify_event_update_task(event_id, message_type, additional_message=""):
+    from models import Event
+    from mailer import queue_event_emails
+    from utils import notify_event_update, build_event_update_message
+
+    event = db.session.get(Event, event_id)
+    if event:
+        notify_event_update(event, message_type, additional_message, commit=False)
+        # Rendered once for the whole event, not once per recipient
+        title, message = build_event_update_message(event, message_type, additional_message)
+        queue_event_emails(event, title, f"<p>{message}</p>", commit=False)
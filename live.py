@@ -0,0 +1,273 @@
+import json
+import time
+import logging
+import itertools
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from flask import request, jsonify
+from flask_login import current_user
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+from app import app, db
+from models import User, Event, EventRegistration
+
+# Live seat counts and unread badges over Server-Sent Events. Writers mark
+# what they changed (touch_event / touch_users) in the current session;
+# right before the commit the new state is read once, and after the commit
+# it is published on 'event:<id>' and 'user:<id>' channels. Each open
+# /api/live stream holds the latest message per channel it follows, so a
+# slow client skips intermediate states instead of queueing them.
+
+RETRY_MILLISECONDS = 5000
+
+class Subscription:
+    """One stream's pending messages, coalesced to the latest per channel"""
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+
+    def push(self, channel, data):
+        with self.condition:
+            self.pending.pop(channel, None)
+            self.pending[channel] = data
+            self.condition.notify()
+
+    def wait(self, timeout):
+        """Return pending (channel, data) pairs, waiting up to timeout for one"""
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            messages = list(self.pending.items())
+            self.pending.clear()
+        return messages
+
+class MemoryBroker:
+    """In-process pub/sub; streams only see publishes from their own process"""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def wants(self, channel):
+        return channel in self.subscribers
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels)
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[channel]
+
+    def deliver(self, channel, data):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(channel, data)
+
+    def publish(self, channel, data):
+        self.deliver(channel, data)
+
+class RedisBroker(MemoryBroker):
+    """Fan-out through Redis pub/sub, so every worker and host sees each publish"""
+
+    def __init__(self, url, prefix='festagram:live:'):
+        super().__init__()
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.listener = None
+        self.listener_lock = threading.Lock()
+
+    def wants(self, channel):
+        # Subscribers may be in any process
+        return True
+
+    def subscribe(self, channels):
+        with self.listener_lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self._listen, name='live-listener', daemon=True)
+                self.listener.start()
+        return super().subscribe(channels)
+
+    def publish(self, channel, data):
+        self.client.publish(self.prefix + channel, json.dumps(data))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for message in pubsub.listen():
+                    channel = message['channel'].decode()[len(self.prefix):]
+                    self.deliver(channel, json.loads(message['data']))
+            except Exception as e:
+                logging.error(f"Live update listener lost Redis: {str(e)}")
+                time.sleep(1)
+
+def create_broker(config):
+    """Build the broker selected by LIVE_BROKER"""
+    if config['LIVE_BROKER'] == 'redis':
+        return RedisBroker(config['LIVE_REDIS_URL'])
+    return MemoryBroker()
+
+broker = create_broker(app.config)
+message_ids = itertools.count(1)
+connections = Counter()
+connections_lock = threading.Lock()
+
+def touch_event(*event_ids):
+    """Publish the seat counts of these events once the session commits"""
+    db.session.info.setdefault('live_events', set()).update(event_ids)
+
+def touch_users(*user_ids):
+    """Publish the unread counts of these users once the session commits"""
+    db.session.info.setdefault('live_users', set()).update(user_ids)
+
+def event_states(session, event_ids):
+    waitlist = select(func.count(EventRegistration.id)).where(
+        EventRegistration.event_id == Event.id,
+        EventRegistration.status == 'waitlisted'
+    ).scalar_subquery()
+    rows = session.execute(
+        select(Event.id, Event.current_registrations, Event.capacity, waitlist)
+        .where(Event.id.in_(list(event_ids)))
+    )
+    return [(f'event:{event_id}', {
+        'id': event_id,
+        'current_registrations': current or 0,
+        'capacity': capacity,
+        'available': max(0, capacity - (current or 0)),
+        'waitlist': waitlisted
+    }) for event_id, current, capacity, waitlisted in rows]
+
+def unread_counts(session, user_ids):
+    rows = session.execute(select(User.id, User.unread_count).where(User.id.in_(list(user_ids))))
+    return [(f'user:{user_id}', {'unread': unread}) for user_id, unread in rows]
+
+@event.listens_for(Session, 'before_commit')
+def _collect_live_messages(session):
+    event_ids = {event_id for event_id in session.info.pop('live_events', ())
+                 if broker.wants(f'event:{event_id}')}
+    user_ids = {user_id for user_id in session.info.pop('live_users', ())
+                if broker.wants(f'user:{user_id}')}
+    if not event_ids and not user_ids:
+        return
+    session.flush()
+    messages = session.info.setdefault('live_messages', [])
+    if event_ids:
+        messages.extend(event_states(session, event_ids))
+    for start in range(0, len(user_ids), 500):
+        messages.extend(unread_counts(session, list(user_ids)[start:start + 500]))
+
+@event.listens_for(Session, 'after_commit')
+def _publish_live_messages(session):
+    for channel, data in session.info.pop('live_messages', ()):
+        try:
+            broker.publish(channel, data)
+        except Exception as e:
+            logging.error(f"Failed to publish live update on {channel}: {str(e)}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_live_messages(session):
+    for key in ('live_events', 'live_users', 'live_messages'):
+        session.info.pop(key, None)
+
+def acquire_connection(user_id):
+    """Reserve a stream slot; False when the process or user is at the limit"""
+    with connections_lock:
+        if connections['total'] >= app.config['LIVE_MAX_CONNECTIONS']:
+            return False
+        if user_id is not None and connections[user_id] >= app.config['LIVE_MAX_PER_USER']:
+            return False
+        connections['total'] += 1
+        if user_id is not None:
+            connections[user_id] += 1
+        return True
+
+def release_connection(user_id):
+    with connections_lock:
+        connections['total'] -= 1
+        if user_id is not None:
+            connections[user_id] -= 1
+            if connections[user_id] <= 0:
+                del connections[user_id]
+
+def format_message(channel, data):
+    kind = 'seats' if channel.startswith('event:') else 'unread'
+    return f"id: {next(message_ids)}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+def stream(subscription, snapshot, heartbeat, max_age):
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    for channel, data in snapshot:
+        yield format_message(channel, data)
+    # Streams end after max_age so workers recycle; the browser reconnects
+    deadline = time.monotonic() + max_age
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        messages = subscription.wait(min(heartbeat, remaining))
+        if not messages:
+            # Keeps proxies from timing out idle streams and detects closed clients
+            yield ": heartbeat\n\n"
+        for channel, data in messages:
+            yield format_message(channel, data)
+
+@app.route('/api/live')
+def live_updates():
+    if not app.config['LIVE_ENABLED']:
+        return jsonify(error='Live updates are disabled.'), 404
+    try:
+        event_ids = sorted({int(value) for value in request.args.get('events', '').split(',') if value.strip()})
+    except ValueError:
+        return jsonify(error='events must be a comma-separated list of ids.'), 400
+    if len(event_ids) > app.config['LIVE_MAX_EVENTS']:
+        return jsonify(error=f"At most {app.config['LIVE_MAX_EVENTS']} events per stream."), 400
+    user_id = current_user.id if current_user.is_authenticated else None
+    channels = [f'event:{event_id}' for event_id in event_ids]
+    if user_id is not None:
+        channels.append(f'user:{user_id}')
+    if not channels:
+        return jsonify(error='Nothing to follow.'), 400
+
+    if not acquire_connection(user_id):
+        response = jsonify(error='Too many live connections; retry later.')
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    subscription = broker.subscribe(channels)
+
+    # A reconnecting client may have missed publishes; send it the current state
+    snapshot = []
+    if request.headers.get('Last-Event-ID') or request.args.get('resync'):
+        if event_ids:
+            snapshot.extend(event_states(db.session, event_ids))
+        if user_id is not None:
+            snapshot.extend(unread_counts(db.session, [user_id]))
+        db.session.rollback()
+
+    response = app.response_class(
+        stream(subscription, snapshot, app.config['LIVE_HEARTBEAT'], app.config['LIVE_MAX_AGE']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the server closes the response, even if it never started streaming
+    released = []
+    def release():
+        if not released:
+            released.append(True)
+            broker.unsubscribe(subscription)
+            release_connection(user_id)
+    response.call_on_close(release)
+    return response
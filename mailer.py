@@ -0,0 +1,193 @@
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import insert, select, update, literal, or_, and_
+from app import app, db
+from models import EmailOutbox, EventRegistration, User
+
+def _outbox_columns():
+    return ['recipient', 'subject', 'html', 'status', 'attempts', 'related_event_id', 'created_at']
+
+def _outbox_select(email_column, subject, html, related_event_id):
+    return select(
+        email_column,
+        literal(subject),
+        literal(html),
+        literal('queued'),
+        literal(0),
+        literal(related_event_id),
+        literal(datetime.utcnow())
+    )
+
+def queue_email(subject, recipients, html, related_event_id=None, commit=True):
+    """Add an email to the outbox for each recipient address"""
+    recipients = [recipients] if isinstance(recipients, str) else list(recipients)
+    if recipients:
+        created_at = datetime.utcnow()
+        db.session.execute(insert(EmailOutbox), [
+            {
+                'recipient': recipient,
+                'subject': subject,
+                'html': html,
+                'status': 'queued',
+                'attempts': 0,
+                'related_event_id': related_event_id,
+                'created_at': created_at
+            }
+            for recipient in recipients
+        ])
+    if commit:
+        db.session.commit()
+    return len(recipients)
+
+def queue_user_emails(user_ids, subject, html, related_event_id=None, commit=True):
+    """Queue one rendered email for many users, resolving addresses in SQL"""
+    if not app.config['MAIL_ENABLED']:
+        return 0
+    result = db.session.execute(
+        insert(EmailOutbox).from_select(
+            _outbox_columns(),
+            _outbox_select(User.email, subject, html, related_event_id).where(User.id.in_(list(user_ids)))
+        )
+    )
+    if commit:
+        db.session.commit()
+    return result.rowcount
+
+def queue_event_emails(event, subject, html, commit=True):
+    """Queue one rendered email for everyone registered for an event"""
+    if not app.config['MAIL_ENABLED']:
+        return 0
+    result = db.session.execute(
+        insert(EmailOutbox).from_select(
+            _outbox_columns(),
+            _outbox_select(User.email, subject, html, event.id)
+            .join(EventRegistration, EventRegistration.user_id == User.id)
+            .where(EventRegistration.event_id == event.id, EventRegistration.status != 'cancelled')
+        )
+    )
+    if commit:
+        db.session.commit()
+    return result.rowcount
+
+def claim_outbox_batch(batch_size):
+    """Atomically mark a batch of queued emails as sending and return them"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'])
+    due = or_(
+        and_(EmailOutbox.status == 'queued',
+             or_(EmailOutbox.next_attempt_at.is_(None), EmailOutbox.next_attempt_at <= now)),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.locked_at < stale)
+    )
+    token = str(uuid.uuid4())
+
+    ids = db.session.execute(
+        select(EmailOutbox.id).where(due).order_by(EmailOutbox.id).limit(batch_size)
+    ).scalars().all()
+    if ids:
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids), due)
+            .values(status='sending', claim_token=token, locked_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    if not ids:
+        return []
+    return EmailOutbox.query.filter_by(claim_token=token).order_by(EmailOutbox.id).all()
+
+_mail = None
+
+def get_mail():
+    """The Flask-Mail extension, initialized on first use"""
+    global _mail
+    if _mail is None:
+        from flask_mail import Mail
+        _mail = Mail(app)
+    return _mail
+
+def _record_failure(email, error, max_attempts):
+    """Give up on an email after max_attempts, else retry it with backoff"""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+    else:
+        email.status = 'queued'
+        delay = app.config['MAIL_RETRY_BASE_SECONDS'] * 2 ** (email.attempts - 1)
+        email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+def deliver_outbox(batch_size=None, max_per_second=None):
+    """Send one batch of queued emails over a single SMTP connection
+
+    Returns (sent, failed) counts for the batch.
+    """
+    from flask_mail import Message
+
+    batch_size = batch_size or app.config['MAIL_BATCH_SIZE']
+    max_per_second = max_per_second or app.config['MAIL_MAX_PER_SECOND']
+    interval = 1.0 / max_per_second if max_per_second else 0
+    max_attempts = app.config['MAIL_MAX_ATTEMPTS']
+
+    emails = claim_outbox_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    try:
+        with get_mail().connect() as connection:
+            next_send = time.monotonic()
+            for email in emails:
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_send = max(next_send, time.monotonic()) + interval
+
+                try:
+                    connection.send(Message(
+                        subject=email.subject,
+                        recipients=[email.recipient],
+                        html=email.html,
+                        sender=app.config['MAIL_DEFAULT_SENDER']
+                    ))
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    sent += 1
+                except Exception as e:
+                    _record_failure(email, e, max_attempts)
+                    failed += 1
+                email.claim_token = None
+                email.locked_at = None
+    except Exception as e:
+        # Could not connect (or the connection dropped); unsent emails go back
+        logging.error(f"SMTP connection failed: {str(e)}")
+        for email in emails:
+            if email.status == 'sending':
+                _record_failure(email, e, max_attempts)
+                email.claim_token = None
+                email.locked_at = None
+                failed += 1
+
+    db.session.commit()
+    logging.info(f"Outbox batch delivered: {sent} sent, {failed} failed")
+    return sent, failed
+
+@app.cli.command('send-outbox')
+@click.option('--loop', is_flag=True, help='Keep polling the outbox instead of exiting when it is empty.')
+@click.option('--poll-interval', default=5.0, show_default=True, help='Seconds to sleep when idle.')
+def send_outbox_command(loop, poll_interval):
+    """Deliver queued emails from the outbox"""
+    total_sent = total_failed = 0
+    started = time.monotonic()
+    while True:
+        sent, failed = deliver_outbox()
+        total_sent += sent
+        total_failed += failed
+        if sent:
+            continue
+        if not loop:
+            break
+        time.sleep(poll_interval)
+    click.echo(f"Sent {total_sent} emails, {total_failed} failed in {time.monotonic() - started:.1f}s")
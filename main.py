@@ -1,5 +1,14 @@
+import os
 from app import app
 import routes  # noqa: F401
+import reminders  # noqa: F401
+import metrics  # noqa: F401
+import live  # noqa: F401
+
+# Modules that only add CLI commands; the web entry points never need them
+if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+    import imports  # noqa: F401
+    import retention  # noqa: F401
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,166 @@
+import hmac
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from flask import g, request, has_request_context, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+# Per-request SQL accounting plus a Prometheus text endpoint. Counters live
+# in process memory, so with several workers each one reports its own
+# numbers; Prometheus sums them per instance label.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# Issued by the driver or sqlite_profile around every transaction; they take
+# time but are not queries a view can avoid, so they are not counted
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+class Registry:
+    """Thread-safe counters and histograms rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.help = {}
+
+    def describe(self, name, kind, help_text):
+        self.help[name] = (kind, help_text)
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = [buckets, [0] * len(buckets), 0, 0.0]
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                histogram[1][index] += 1
+            histogram[2] += 1
+            histogram[3] += value
+
+    def render(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (value[0], list(value[1]), value[2], value[3]) for key, value in self.histograms.items()}
+        series = defaultdict(list)
+        for (name, labels), value in sorted(counters.items()):
+            series[name].append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), (buckets, counts, total, total_sum) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(buckets, counts):
+                cumulative += count
+                series[name].append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            series[name].append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {total}")
+            series[name].append(f"{name}_sum{_labels(labels)} {_number(total_sum)}")
+            series[name].append(f"{name}_count{_labels(labels)} {total}")
+        lines = []
+        for name in sorted(series):
+            kind, help_text = self.help.get(name, ('untyped', ''))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(series[name])
+        return '\n'.join(lines) + '\n'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+registry = Registry()
+registry.describe('festagram_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status.')
+registry.describe('festagram_http_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint.')
+registry.describe('festagram_http_request_exceptions_total', 'counter', 'Requests that raised an unhandled exception.')
+registry.describe('festagram_db_queries_per_request', 'histogram', 'SQL statements executed per request.')
+registry.describe('festagram_db_query_seconds_total', 'counter', 'Time spent in SQL statements by endpoint.')
+registry.describe('festagram_db_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_SECONDS.')
+registry.describe('festagram_db_transaction_wait_seconds_total', 'counter',
+                  'Time spent in BEGIN/COMMIT/ROLLBACK, mostly waiting for the SQLite write lock.')
+
+def _endpoint():
+    return request.endpoint or '<unmatched>'
+
+def is_query(statement):
+    """Whether a statement counts towards a request's query count"""
+    return not statement.lstrip().upper().startswith(TRANSACTION_CONTROL)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    endpoint = None
+    query = is_query(statement)
+    if has_request_context() and 'query_count' in g:
+        if query:
+            g.query_count += 1
+        g.query_time += elapsed
+        endpoint = _endpoint()
+    if not query:
+        # A slow BEGIN IMMEDIATE is a lock wait, not a slow query
+        registry.inc('festagram_db_transaction_wait_seconds_total', (('endpoint', endpoint or '<background>'),), elapsed)
+    elif elapsed >= app.config['SLOW_QUERY_SECONDS']:
+        registry.inc('festagram_db_slow_queries_total', (('endpoint', endpoint or '<background>'),))
+        logging.warning(f"Slow query ({elapsed * 1000:.0f} ms) in {endpoint or 'background task'}: "
+                        f"{' '.join(statement.split())[:1000]}")
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.query_count = 0
+    g.query_time = 0.0
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = _endpoint()
+    registry.inc('festagram_http_requests_total',
+                 (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+    registry.observe('festagram_http_request_duration_seconds', (('endpoint', endpoint),), elapsed, LATENCY_BUCKETS)
+    registry.observe('festagram_db_queries_per_request', (('endpoint', endpoint),), g.query_count, QUERY_COUNT_BUCKETS)
+    registry.inc('festagram_db_query_seconds_total', (('endpoint', endpoint),), g.query_time)
+    response.headers['Server-Timing'] = (
+        f'db;dur={g.query_time * 1000:.1f};desc="{g.query_count} queries", app;dur={elapsed * 1000:.1f}'
+    )
+    return response
+
+@app.teardown_request
+def record_request_exception(exc):
+    if exc is not None:
+        endpoint = _endpoint() if has_request_context() else '<unmatched>'
+        registry.inc('festagram_http_request_exceptions_total', (('endpoint', endpoint),))
+
+@app.route('/metrics')
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        # Off until a token is set. Allowing localhost instead would expose
+        # the endpoint through a reverse proxy on the same host
+        abort(404)
+    supplied = request.headers.get('Authorization', '').encode()
+    if not hmac.compare_digest(supplied, f'Bearer {token}'.encode()):
+        abort(401)
+    return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
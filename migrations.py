@@ -0,0 +1,138 @@
+import logging
+from datetime import datetime
+import click
+from sqlalchemy import select, func, inspect
+from sqlalchemy.schema import CreateColumn
+from app import app, db
+from models import User, Event, EventRegistration, Notification, EmailOutbox, SchemaMigration
+
+# db.create_all() only creates missing tables; it never alters existing ones.
+# Schema changes to existing tables are applied here as ordered, one-off
+# migrations recorded in the schema_migration table.
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a function as a schema migration"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+def create_missing_indexes():
+    """Create every index declared on the models that the database lacks"""
+    connection = db.session.connection()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+def add_column(model, column_name):
+    """Add a model column to an existing table unless it is already there"""
+    table = model.__table__
+    connection = db.session.connection()
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    if column_name in existing:
+        return
+    dialect = connection.dialect
+    column_ddl = CreateColumn(table.c[column_name]).compile(dialect=dialect)
+    connection.exec_driver_sql(
+        f"ALTER TABLE {dialect.identifier_preparer.format_table(table)} ADD COLUMN {column_ddl}"
+    )
+
+def run_migrations():
+    """Create missing tables and apply pending migrations in order"""
+    db.create_all(bind_key=None)  # the primary only; replicas get the schema by replication
+    applied = set(db.session.execute(select(SchemaMigration.version)).scalars())
+    for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        func()
+        db.session.add(SchemaMigration(version=version, description=description))
+        db.session.commit()
+        logging.info(f"Applied migration {version}: {description}")
+
+@migration('0001', 'Full-text search index for events')
+def add_search_index():
+    from search import ensure_search_index
+    ensure_search_index()
+
+@migration('0002', 'Indexes for hot query shapes')
+def add_hot_query_indexes():
+    create_missing_indexes()
+
+@migration('0003', 'Cached unread notification counter on users')
+def add_user_unread_count():
+    from utils import reconcile_unread_counts
+    add_column(User, 'unread_count')
+    reconcile_unread_counts()
+
+@migration('0004', 'Index for notification retention sweeps')
+def add_notification_created_index():
+    create_missing_indexes()
+
+@migration('0005', 'Retry backoff for outgoing email')
+def add_outbox_next_attempt_at():
+    add_column(EmailOutbox, 'next_attempt_at')
+
+def hot_queries():
+    """(index names, statement) pairs for the queries the indexes serve"""
+    now = datetime.utcnow()
+    return [
+        (('ix_event_upcoming', 'ix_event_active_start'),
+         select(Event.id).where(Event.is_active == True, Event.start_datetime > now).order_by(Event.start_datetime)),
+        (('ix_event_creator_created',),
+         select(Event.id).where(Event.created_by == 1).order_by(Event.created_at.desc())),
+        (('ix_notification_user_read',),
+         select(func.count()).select_from(Notification).where(Notification.user_id == 1, Notification.is_read == False)),
+        (('ix_notification_user_created',),
+         select(Notification.id).where(Notification.user_id == 1).order_by(Notification.created_at.desc())),
+        (('ix_notification_created',),
+         select(Notification.id).where(Notification.created_at < now).order_by(Notification.created_at).limit(1000)),
+        (('ix_registration_event_status_date',),
+         select(EventRegistration.id).where(
+             EventRegistration.event_id == 1, EventRegistration.status == 'waitlisted'
+         ).order_by(EventRegistration.registration_date)),
+    ]
+
+def explain(statement):
+    """Return the database's query plan for a statement as one string"""
+    dialect = db.engine.dialect
+    compiled = statement.compile(dialect=dialect)
+    params = compiled.params
+    if compiled.positiontup:
+        params = tuple(params[name] for name in compiled.positiontup)
+    connection = db.session.connection()
+    if dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+    else:
+        # Tiny tables would otherwise always plan as sequential scans
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), params).all()
+    db.session.rollback()
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations"""
+    run_migrations()
+    click.echo("Database is up to date")
+
+@app.cli.command('reconcile-unread-counts')
+def reconcile_unread_counts_command():
+    """Repair drifted unread notification counters"""
+    from utils import reconcile_unread_counts
+    repaired = reconcile_unread_counts()
+    click.echo(f"Repaired {repaired} unread counters")
+
+@app.cli.command('db-check-indexes')
+def db_check_indexes_command():
+    """Fail unless every hot query's plan uses its index"""
+    missing = 0
+    for index_names, statement in hot_queries():
+        plan = explain(statement)
+        if any(name in plan for name in index_names):
+            click.echo(f"ok    {index_names[0]}")
+        else:
+            missing += 1
+            click.echo(f"MISS  {index_names[0]}\n{plan}")
+    if missing:
+        raise SystemExit(1)
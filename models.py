@@ -18,6 +18,8 @@ class User(UserMixin, db.Model):
     year = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # Denormalized count of unread notifications, kept in step by utils
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     registrations = db.relationship('EventRegistration', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -62,6 +64,15 @@ class Event(db.Model):
     # Relationships
     registrations = db.relationship('EventRegistration', backref='event', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_event_active_start', 'is_active', 'start_datetime'),
+        db.Index('ix_event_creator_created', 'created_by', 'created_at'),
+        # Only active events are listed publicly
+        db.Index('ix_event_upcoming', 'start_datetime',
+                 sqlite_where=db.text('is_active = 1'),
+                 postgresql_where=db.text('is_active')),
+    )
+    
     def is_full(self):
         return self.current_registrations >= self.capacity
     
@@ -86,7 +97,10 @@ class EventRegistration(db.Model):
     notes = db.Column(db.Text, nullable=True)
     
     # Unique constraint to prevent duplicate registrations
-    __table_args__ = (db.UniqueConstraint('user_id', 'event_id', name='unique_user_event'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'event_id', name='unique_user_event'),
+        db.Index('ix_registration_event_status_date', 'event_id', 'status', 'registration_date'),
+    )
     
     def __repr__(self):
         return f'<EventRegistration User:{self.user_id} Event:{self.event_id} Status:{self.status}>'
@@ -104,5 +118,123 @@ class Notification(db.Model):
     # Relationship
     related_event = db.relationship('Event', backref='notifications')
     
+    __table_args__ = (
+        db.Index('ix_notification_user_read', 'user_id', 'is_read'),
+        db.Index('ix_notification_user_created', 'user_id', 'created_at'),
+        db.Index('ix_notification_created', 'created_at'),  # retention sweeps
+    )
+    
     def __repr__(self):
         return f'<Notification {self.title}>'
+
+class NotificationArchive(db.Model):
+    __tablename__ = 'notification_archive'
+    
+    # Cold copy of notifications moved out of the hot table by the retention
+    # sweep; no foreign keys, so archived rows never block other deletes
+    id = db.Column(db.Integer, primary_key=True)  # the original notification id
+    user_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime)
+    related_event_id = db.Column(db.Integer, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_notification_archive_user_created', 'user_id', 'created_at'),
+    )
+    
+    def __repr__(self):
+        return f'<NotificationArchive {self.id}>'
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # key into jobs.TASKS
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON encoded keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=True)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+    
+    def __repr__(self):
+        return f'<Job {self.name} {self.status}>'
+
+class EmailOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    claim_token = db.Column(db.String(36), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)  # retry backoff; NULL means due now
+    last_error = db.Column(db.Text, nullable=True)
+    related_event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_email_outbox_status', 'status', 'id'),
+        db.Index('ix_email_outbox_claim_token', 'claim_token'),
+    )
+    
+    def __repr__(self):
+        return f'<EmailOutbox {self.recipient} {self.status}>'
+
+class SchemaMigration(db.Model):
+    version = db.Column(db.String(50), primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
+
+class StatsSnapshot(db.Model):
+    __tablename__ = 'stats_snapshot'
+    
+    # 'global' for site-wide numbers, 'organizer:<user id>' per organizer
+    scope = db.Column(db.String(50), primary_key=True)
+    total_events = db.Column(db.Integer, nullable=False, default=0)
+    active_events = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_events = db.Column(db.Integer, nullable=False, default=0)
+    total_registrations = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'total_events': self.total_events,
+            'active_events': self.active_events,
+            'upcoming_events': self.upcoming_events,
+            'total_registrations': self.total_registrations,
+            'refreshed_at': self.refreshed_at
+        }
+    
+    def __repr__(self):
+        return f'<StatsSnapshot {self.scope}>'
+
+class EventReminder(db.Model):
+    __tablename__ = 'event_reminder'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    window_minutes = db.Column(db.Integer, nullable=False)  # reminder sent this long before the start
+    recipients = db.Column(db.Integer, nullable=False, default=0)  # 0 when a narrower window already covered it
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # A sweep that finds the row already present skips the pair, so reruns never duplicate
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'window_minutes', name='unique_event_reminder_window'),
+    )
+    
+    def __repr__(self):
+        return f'<EventReminder {self.event_id} {self.window_minutes}m>'
@@ -0,0 +1,195 @@
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import Event, EventRegistration
+from utils import create_notification, bulk_create_notifications
+from mailer import queue_user_emails
+from live import touch_event
+import logging
+import click
+
+# Every function here stages its work in the current session and leaves
+# exactly one commit to the public entry points, so a seat claim, the
+# registration row and its notification either all land or none do.
+
+def claim_seat(event_id):
+    """Atomically take one seat; returns False when the event is full"""
+    result = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id, Event.current_registrations < Event.capacity)
+        .values(current_registrations=Event.current_registrations + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def release_seat(event_id):
+    """Atomically give one seat back, never going below zero"""
+    db.session.execute(
+        update(Event)
+        .where(Event.id == event_id, Event.current_registrations > 0)
+        .values(current_registrations=Event.current_registrations - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def register_for_event(event, user_id):
+    """Register a user for an event in a single transaction
+
+    Returns 'registered', 'waitlisted', 'full' (no seat and the event has no
+    waitlist), or None if the user already holds a registration for the event.
+    """
+    try:
+        if claim_seat(event.id):
+            status = 'registered'
+        elif event.allow_waitlist:
+            status = 'waitlisted'
+        else:
+            db.session.rollback()
+            return 'full'
+        db.session.add(EventRegistration(user_id=user_id, event_id=event.id, status=status))
+        touch_event(event.id)
+
+        if status == 'registered':
+            title = f"Registration Confirmed: {event.title}"
+            message = f"You have successfully registered for '{event.title}' on {event.start_datetime.strftime('%B %d, %Y at %I:%M %p')}."
+            notification_type = 'registration_confirmed'
+        else:
+            title = f"Added to Waitlist: {event.title}"
+            message = f"The event '{event.title}' is currently full, but you have been added to the waitlist. You will be notified if a spot becomes available."
+            notification_type = 'waitlist_added'
+
+        create_notification(
+            user_id=user_id,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            related_event_id=event.id,
+            commit=False
+        )
+        queue_user_emails([user_id], title, f"<p>{message}</p>", related_event_id=event.id, commit=False)
+        db.session.commit()
+    except IntegrityError:
+        # unique_user_event fired (possibly at an autoflush): a concurrent
+        # request won; the rollback also returns the seat claimed above.
+        db.session.rollback()
+        return None
+
+    db.session.expire(event, ['current_registrations'])
+    logging.info(f"User {user_id} {status} for event {event.id}")
+    return status
+
+def cancel_event_registration(event, user_id):
+    """Cancel a user's registration and promote the waitlist in one transaction
+
+    Returns the status the registration had, or None if there was none.
+    """
+    freed = db.session.execute(
+        delete(EventRegistration)
+        .where(
+            EventRegistration.user_id == user_id,
+            EventRegistration.event_id == event.id,
+            EventRegistration.status == 'registered'
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if freed:
+        status = 'registered'
+        release_seat(event.id)
+        process_waitlist(event, commit=False)
+    else:
+        removed = db.session.execute(
+            delete(EventRegistration)
+            .where(EventRegistration.user_id == user_id, EventRegistration.event_id == event.id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        status = 'waitlisted' if removed else None
+
+    if status:
+        touch_event(event.id)
+    db.session.commit()
+    db.session.expire(event, ['current_registrations'])
+    return status
+
+def process_waitlist(event, commit=True):
+    """Promote the oldest waitlisted users into every free seat
+
+    Promotion is one UPDATE over the registrations plus one counter UPDATE
+    and bulk notifications, all in the caller's transaction. Call it after
+    the write that freed seats (cancellation, capacity change) so the event
+    row is already locked. Returns the number of users promoted.
+    """
+    capacity, current = db.session.execute(
+        select(Event.capacity, Event.current_registrations)
+        .where(Event.id == event.id)
+        .with_for_update()
+    ).one()
+    available_spots = max(0, capacity - (current or 0))
+    if available_spots <= 0:
+        return 0
+
+    next_in_line = select(EventRegistration.id).where(
+        EventRegistration.event_id == event.id,
+        EventRegistration.status == 'waitlisted'
+    ).order_by(EventRegistration.registration_date, EventRegistration.id).limit(available_spots)
+
+    promoted_user_ids = db.session.execute(
+        update(EventRegistration)
+        .where(EventRegistration.id.in_(next_in_line), EventRegistration.status == 'waitlisted')
+        .values(status='registered')
+        .returning(EventRegistration.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if not promoted_user_ids:
+        return 0
+    touch_event(event.id)
+
+    db.session.execute(
+        update(Event)
+        .where(Event.id == event.id)
+        .values(current_registrations=Event.current_registrations + len(promoted_user_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    title = f"You're off the waitlist: {event.title}"
+    message = f"Great news! A spot has opened up for '{event.title}' and you have been moved from the waitlist to confirmed registration."
+    bulk_create_notifications(
+        promoted_user_ids,
+        title=title,
+        message=message,
+        notification_type='waitlist_promoted',
+        related_event_id=event.id,
+        commit=False
+    )
+    queue_user_emails(promoted_user_ids, title, f"<p>{message}</p>", related_event_id=event.id, commit=False)
+
+    if commit:
+        db.session.commit()
+    db.session.expire(event, ['current_registrations'])
+    logging.info(f"Promoted {len(promoted_user_ids)} waitlisted users for event {event.id}")
+    return len(promoted_user_ids)
+
+def process_all_waitlists():
+    """Run waitlist promotion for every active event with free seats"""
+    event_ids = db.session.execute(
+        select(Event.id).where(
+            Event.is_active == True,
+            Event.current_registrations < Event.capacity,
+            select(EventRegistration.id).where(
+                EventRegistration.event_id == Event.id,
+                EventRegistration.status == 'waitlisted'
+            ).exists()
+        )
+    ).scalars().all()
+
+    promoted = 0
+    for event_id in event_ids:
+        # One transaction per event keeps lock time short
+        event = db.session.get(Event, event_id)
+        promoted += process_waitlist(event)
+    return promoted
+
+@app.cli.command('process-waitlists')
+def process_waitlists_command():
+    """Promote waitlisted users wherever seats are free"""
+    promoted = process_all_waitlists()
+    click.echo(f"Promoted {promoted} waitlisted users")
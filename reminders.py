@@ -0,0 +1,181 @@
+import re
+import time
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import select, insert, func
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import Event, EventRegistration, EventReminder, Notification
+from utils import NOTIFICATION_BATCH_SIZE, adjust_unread_count, build_event_update_message
+
+# Reminder sweeps. Each sweep looks for events that have entered a reminder
+# window (e.g. 24h or 1h before the start) and have no event_reminder row
+# for it yet, notifies everyone registered, and records the pair. An event
+# first found inside a narrower window only gets that reminder; the wider
+# windows are recorded as covered.
+
+def parse_windows(value):
+    """Parse '24h,1h,30m' into reminder windows in minutes, widest first"""
+    units = {'d': 1440, 'h': 60, 'm': 1}
+    windows = set()
+    for part in value.split(','):
+        match = re.fullmatch(r'\s*(\d+)\s*([dhm]?)\s*', part)
+        if not match:
+            raise ValueError(f"Invalid reminder window: {part!r}")
+        windows.add(int(match.group(1)) * units[match.group(2) or 'm'])
+    return sorted(windows, reverse=True)
+
+def format_window(minutes):
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440}d"
+    if minutes % 60 == 0:
+        return f"{minutes // 60}h"
+    return f"{minutes}m"
+
+def due_reminders(windows, now):
+    """Map window -> ids of active events that entered it and weren't reminded"""
+    due = {}
+    for minutes in windows:
+        already_sent = select(EventReminder.id).where(
+            EventReminder.event_id == Event.id,
+            EventReminder.window_minutes == minutes
+        ).exists()
+        due[minutes] = set(db.session.execute(
+            select(Event.id).where(
+                Event.is_active == True,
+                Event.start_datetime > now,
+                Event.start_datetime <= now + timedelta(minutes=minutes),
+                ~already_sent
+            )
+        ).scalars())
+    return due
+
+def send_reminders(windows=None, now=None):
+    """Run one reminder sweep in a single transaction
+
+    Returns (events reminded, notifications written).
+    """
+    from mailer import queue_user_emails
+
+    windows = windows or parse_windows(app.config['REMINDER_WINDOWS'])
+    now = now or datetime.utcnow()
+    due = due_reminders(windows, now)
+    event_ids = set().union(*due.values())
+    if not event_ids:
+        return 0, 0
+
+    # An event due for several windows is reminded once, for the narrowest,
+    # and never after a narrower reminder it already received
+    narrowest = {}
+    for minutes in sorted(due, reverse=True):
+        for event_id in due[minutes]:
+            narrowest[event_id] = minutes
+    narrowest_sent = dict(db.session.execute(
+        select(EventReminder.event_id, func.min(EventReminder.window_minutes))
+        .where(EventReminder.event_id.in_(event_ids))
+        .group_by(EventReminder.event_id)
+    ).all())
+
+    recipients = defaultdict(list)
+    for event_id, user_id in db.session.execute(
+        select(EventRegistration.event_id, EventRegistration.user_id).where(
+            EventRegistration.event_id.in_(event_ids),
+            EventRegistration.status == 'registered'
+        )
+    ):
+        recipients[event_id].append(user_id)
+
+    events = {event.id: event for event in Event.query.filter(Event.id.in_(event_ids))}
+    reminder_rows = []
+    notifications = []
+    emails = []
+    for minutes, ids in due.items():
+        for event_id in ids:
+            send = narrowest[event_id] == minutes and narrowest_sent.get(event_id, minutes + 1) > minutes
+            users = recipients[event_id] if send else []
+            reminder_rows.append({'event_id': event_id, 'window_minutes': minutes,
+                                  'recipients': len(users), 'sent_at': now})
+            if not users:
+                continue
+            title, message = build_event_update_message(events[event_id], 'reminder')
+            notifications.extend({
+                'user_id': user_id,
+                'title': title,
+                'message': message,
+                'type': 'reminder',
+                'is_read': False,
+                'created_at': now,
+                'related_event_id': event_id
+            } for user_id in users)
+            emails.append((users, title, f"<p>{message}</p>", event_id))
+
+    try:
+        # Claim the (event, window) pairs first; a concurrent sweep fails here
+        db.session.execute(insert(EventReminder), reminder_rows)
+        for start in range(0, len(notifications), NOTIFICATION_BATCH_SIZE):
+            db.session.execute(insert(Notification), notifications[start:start + NOTIFICATION_BATCH_SIZE])
+        # Users registered for several events get several reminders
+        per_user = Counter(row['user_id'] for row in notifications)
+        by_count = defaultdict(list)
+        for user_id, count in per_user.items():
+            by_count[count].append(user_id)
+        for count, user_ids in by_count.items():
+            for start in range(0, len(user_ids), NOTIFICATION_BATCH_SIZE):
+                adjust_unread_count(user_ids[start:start + NOTIFICATION_BATCH_SIZE], count)
+        for users, title, html, event_id in emails:
+            queue_user_emails(users, title, html, event_id, commit=False)
+        db.session.commit()
+    except IntegrityError:
+        # Another sweep recorded the same pairs first; it sent those reminders
+        db.session.rollback()
+        logging.info("Reminder sweep skipped: already handled by a concurrent sweep")
+        return 0, 0
+    reminded = len(emails)
+    logging.info(f"Reminder sweep: {reminded} events, {len(notifications)} notifications")
+    return reminded, len(notifications)
+
+def start_reminder_timer(interval):
+    """Sweep every interval seconds from a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    send_reminders()
+                except Exception as e:
+                    logging.error(f"Reminder sweep failed: {str(e)}")
+                    db.session.rollback()
+    thread = threading.Thread(target=run, name='reminder-timer', daemon=True)
+    thread.start()
+    return thread
+
+_timer_lock = threading.Lock()
+_timer = None
+
+@app.before_request
+def ensure_reminder_timer():
+    global _timer
+    if _timer is not None or not app.config['REMINDER_INTERVAL']:
+        return
+    with _timer_lock:
+        if _timer is None:
+            _timer = start_reminder_timer(app.config['REMINDER_INTERVAL'])
+
+@app.cli.command('send-reminders')
+@click.option('--windows', default=None, help='Comma-separated windows such as 24h,1h (default: REMINDER_WINDOWS).')
+@click.option('--loop', is_flag=True, help='Keep sweeping instead of exiting after one pass.')
+@click.option('--interval', default=60.0, show_default=True, help='Seconds between sweeps.')
+def send_reminders_command(windows, loop, interval):
+    """Send reminders for events entering a reminder window"""
+    windows = parse_windows(windows or app.config['REMINDER_WINDOWS'])
+    click.echo(f"Reminder windows: {', '.join(format_window(minutes) for minutes in windows)}")
+    while True:
+        started = time.perf_counter()
+        reminded, written = send_reminders(windows)
+        click.echo(f"Reminded {reminded} events ({written} notifications) in {time.perf_counter() - started:.2f}s")
+        if not loop:
+            break
+        time.sleep(interval)
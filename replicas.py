@@ -0,0 +1,98 @@
+import time
+import logging
+import itertools
+from flask import current_app, request, session, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlite_profile import request_writes
+
+# Read replicas. Replica URLs become SQLAlchemy binds ('replica0', ...);
+# RoutingSession sends the queries of read-only requests to one of them,
+# round-robin, and everything else to the primary: writes, flushes, CLI
+# commands and background work, and the requests of a user who wrote
+# within REPLICA_STICKY_SECONDS, so the redirect after registering for an
+# event shows the registration even if the replicas lag behind.
+
+# bind key -> (healthy, monotonic time of the last check)
+_health = {}
+_round_robin = itertools.count()
+
+def replica_keys():
+    return current_app.config['REPLICA_BINDS']
+
+def _mark(key, healthy):
+    previous = _health.get(key, (True, 0))[0]
+    _health[key] = (healthy, time.monotonic())
+    if previous != healthy:
+        if healthy:
+            logging.info(f"Read replica {key} is back; routing reads to it again")
+        else:
+            logging.warning(f"Read replica {key} failed its health check; reading from the primary")
+
+def _is_healthy(key, engine):
+    state = _health.get(key)
+    if state and time.monotonic() - state[1] < current_app.config['REPLICA_HEALTH_INTERVAL']:
+        return state[0]
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql('SELECT 1')
+    except Exception as e:
+        logging.warning(f"Read replica {key} health check failed: {str(e)}")
+        _mark(key, False)
+        return False
+    _mark(key, True)
+    return True
+
+def choose_replica(engines):
+    """Next healthy replica engine in round-robin order, or None"""
+    keys = replica_keys()
+    if not keys:
+        return None
+    start = next(_round_robin)
+    for offset in range(len(keys)):
+        key = keys[(start + offset) % len(keys)]
+        if _is_healthy(key, engines[key]):
+            return engines[key]
+    return None
+
+def reads_from_replica():
+    """Whether queries of the current request may go to a replica"""
+    if not has_request_context() or not replica_keys() or request_writes():
+        return False
+    return session.get('_primary_until', 0) < time.time()
+
+class RoutingSession(Session):
+    """db.session that reads from a replica during read-only requests"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            if reads_from_replica():
+                # One replica per session, so a request reads a single snapshot
+                if 'replica' not in self.info:
+                    engine = choose_replica(self._db.engines)
+                    if engine is None:
+                        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+                    self.info['replica'] = engine
+                return self.info['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(Engine, 'handle_error')
+def _replica_error(context):
+    # Take a replica out of rotation as soon as it drops a connection, not
+    # only at its next health check
+    if context.engine is None or not (context.is_disconnect or context.connection is None):
+        return
+    if not has_app_context():
+        return
+    for key in replica_keys():
+        if current_app.extensions['sqlalchemy'].engines.get(key) is context.engine:
+            _mark(key, False)
+
+def init_app(app):
+    @app.after_request
+    def stick_to_primary(response):
+        # Keep this user's next reads on the primary until replicas catch up
+        if app.config['REPLICA_BINDS'] and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            session['_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
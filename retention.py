@@ -0,0 +1,148 @@
+import time
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import select, insert, delete, func, case, literal
+from app import app, db
+from models import Notification, NotificationArchive
+from utils import adjust_unread_count
+
+# Notification retention. The hot notification table backs the navbar
+# badge, dashboards and /notifications, so it is kept to recent history:
+# read notifications past NOTIFICATION_DELETE_READ_DAYS are deleted, and
+# whatever is left past NOTIFICATION_ARCHIVE_DAYS (unread included) moves to
+# notification_archive. Each batch is its own short transaction, with a
+# pause in between so request writes are never queued behind a long sweep.
+
+ARCHIVED_COLUMNS = ['id', 'user_id', 'title', 'message', 'type', 'is_read', 'created_at', 'related_event_id']
+
+class RetentionResult:
+    def __init__(self):
+        self.deleted = 0
+        self.archived = 0
+        self.batches = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return (self.deleted + self.archived) / self.elapsed if self.elapsed else 0.0
+
+def retention_cutoffs(delete_read_days, archive_days, now):
+    """(delete cutoff, archive cutoff); None for a policy that is off"""
+    delete_before = now - timedelta(days=delete_read_days) if delete_read_days else None
+    archive_before = now - timedelta(days=archive_days) if archive_days else None
+    return delete_before, archive_before
+
+def _oldest(condition, batch_size, *columns):
+    # SKIP LOCKED on Postgres leaves rows that a request is updating right
+    # now for the next sweep; SQLite serializes writers anyway
+    return db.session.execute(
+        select(*columns).where(condition)
+        .order_by(Notification.created_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+def delete_read_batch(before, batch_size):
+    """Delete up to batch_size read notifications created before a cutoff"""
+    ids = [row.id for row in _oldest(
+        (Notification.is_read == True) & (Notification.created_at < before), batch_size, Notification.id
+    )]
+    if ids:
+        db.session.execute(delete(Notification).where(Notification.id.in_(ids)))
+    db.session.commit()
+    return len(ids)
+
+def archive_batch(before, batch_size, now):
+    """Move up to batch_size notifications created before a cutoff to the archive"""
+    rows = _oldest(Notification.created_at < before, batch_size,
+                   Notification.id, Notification.user_id, Notification.is_read)
+    if not rows:
+        db.session.commit()
+        return 0
+    ids = [row.id for row in rows]
+    db.session.execute(insert(NotificationArchive).from_select(
+        ARCHIVED_COLUMNS + ['archived_at'],
+        select(*[getattr(Notification, column) for column in ARCHIVED_COLUMNS], literal(now))
+        .where(Notification.id.in_(ids))
+    ))
+    db.session.execute(delete(Notification).where(Notification.id.in_(ids)))
+    # Unread rows leaving the hot table no longer count towards the badge
+    per_user = Counter(row.user_id for row in rows if row.is_read is False)
+    by_count = defaultdict(list)
+    for user_id, count in per_user.items():
+        by_count[count].append(user_id)
+    for count, user_ids in by_count.items():
+        adjust_unread_count(user_ids, -count)
+    db.session.commit()
+    return len(ids)
+
+def count_prunable(delete_read_days=None, archive_days=None, now=None):
+    """(to delete, to archive) counts for a sweep, without changing anything"""
+    delete_read_days = app.config['NOTIFICATION_DELETE_READ_DAYS'] if delete_read_days is None else delete_read_days
+    archive_days = app.config['NOTIFICATION_ARCHIVE_DAYS'] if archive_days is None else archive_days
+    delete_before, archive_before = retention_cutoffs(delete_read_days, archive_days, now or datetime.utcnow())
+    deletable = (Notification.is_read == True) & (Notification.created_at < delete_before) \
+        if delete_before else literal(False)
+    archivable = (Notification.created_at < archive_before) & ~deletable if archive_before else literal(False)
+    deleted, archived = db.session.execute(select(
+        func.sum(case((deletable, 1), else_=0)),
+        func.sum(case((archivable, 1), else_=0))
+    )).one()
+    db.session.rollback()
+    return deleted or 0, archived or 0
+
+def prune_notifications(delete_read_days=None, archive_days=None, batch_size=None, pause=None, now=None):
+    """Run one retention sweep in batches; returns a RetentionResult"""
+    delete_read_days = app.config['NOTIFICATION_DELETE_READ_DAYS'] if delete_read_days is None else delete_read_days
+    archive_days = app.config['NOTIFICATION_ARCHIVE_DAYS'] if archive_days is None else archive_days
+    batch_size = batch_size or app.config['RETENTION_BATCH_SIZE']
+    pause = app.config['RETENTION_BATCH_PAUSE'] if pause is None else pause
+    now = now or datetime.utcnow()
+    delete_before, archive_before = retention_cutoffs(delete_read_days, archive_days, now)
+
+    result = RetentionResult()
+    started = time.perf_counter()
+    for attribute, before, run_batch in (
+        ('deleted', delete_before, lambda: delete_read_batch(delete_before, batch_size)),
+        ('archived', archive_before, lambda: archive_batch(archive_before, batch_size, now)),
+    ):
+        if before is None:
+            continue
+        while True:
+            moved = run_batch()
+            setattr(result, attribute, getattr(result, attribute) + moved)
+            result.batches += 1
+            if moved < batch_size:
+                break
+            time.sleep(pause)
+    result.elapsed = time.perf_counter() - started
+    logging.info(f"Notification retention: {result.deleted} deleted, {result.archived} archived "
+                 f"in {result.batches} batches ({result.elapsed:.2f}s)")
+    return result
+
+@app.cli.command('prune-notifications')
+@click.option('--delete-read-days', type=int, default=None,
+              help='Delete read notifications older than this (default: NOTIFICATION_DELETE_READ_DAYS; 0 keeps them).')
+@click.option('--archive-days', type=int, default=None,
+              help='Archive notifications older than this (default: NOTIFICATION_ARCHIVE_DAYS; 0 keeps them).')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (default: RETENTION_BATCH_SIZE).')
+@click.option('--dry-run', is_flag=True, help='Only count what a sweep would delete and archive.')
+@click.option('--loop', is_flag=True, help='Keep sweeping instead of exiting after one pass.')
+@click.option('--interval', default=3600.0, show_default=True, help='Seconds between sweeps.')
+def prune_notifications_command(delete_read_days, archive_days, batch_size, dry_run, loop, interval):
+    """Delete old read notifications and archive the rest"""
+    if dry_run:
+        deleted, archived = count_prunable(delete_read_days, archive_days)
+        click.echo(f"Would delete {deleted} and archive {archived} notifications")
+        return
+    while True:
+        result = prune_notifications(delete_read_days, archive_days, batch_size)
+        hot_rows = db.session.scalar(select(func.count(Notification.id)))
+        db.session.rollback()
+        click.echo(f"Deleted {result.deleted}, archived {result.archived} notifications in {result.batches} "
+                   f"batches, {result.elapsed:.2f}s ({result.rate:.0f} rows/s); {hot_rows} remain")
+        if not loop:
+            break
+        time.sleep(interval)
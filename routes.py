@@ -1,17 +1,32 @@
-from flask import render_template, flash, redirect, url_for, request, jsonify, abort
+from flask import render_template, flash, redirect, url_for, request, jsonify, abort, stream_with_context
 from flask_login import login_user, logout_user, current_user, login_required
 from app import app, db, login_manager
 from models import User, Event, EventRegistration, Notification
-from forms import LoginForm, RegistrationForm, ProfileForm, EventForm, SearchForm
-from utils import create_notification, notify_event_update, process_waitlist, get_category_icon, get_category_color
-from datetime import datetime, timedelta
-from sqlalchemy import or_, and_
+from forms import LoginForm, RegistrationForm, ProfileForm, EventForm, SearchForm, BulkImportForm
+from utils import create_notification, mark_notifications_read, get_notifications_page, get_category_icon, get_category_color
+from registrations import register_for_event, cancel_event_registration, process_waitlist
+from jobs import enqueue
+from search import apply_search
+from cache import cached_page, invalidate_event
+from identity import load_identity
+from sqlite_profile import writes_on_get
+from live import touch_event
+from stats import get_event_stats, get_waitlist_counts
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, case, or_, and_
+import hashlib
+
+# Widest window /api/calendar serves, and how long browsers may reuse it
+CALENDAR_MAX_WINDOW_DAYS = 400
+CALENDAR_CACHE_SECONDS = 60
+REGISTRATIONS_PER_PAGE = 50
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_identity(int(user_id))
 
 @app.route('/')
+@cached_page('events')
 def index():
     if current_user.is_authenticated:
         if current_user.is_admin():
@@ -95,17 +110,24 @@ def student_dashboard():
     elif current_user.is_organizer():
         return redirect(url_for('organizer_dashboard'))
     
-    # Get user's registered events
-    registered_events = db.session.query(Event).join(EventRegistration).filter(
+    # Get user's registered events with the registration status in one query
+    registered_events = db.session.query(Event, EventRegistration.status).join(
+        EventRegistration, EventRegistration.event_id == Event.id
+    ).filter(
         EventRegistration.user_id == current_user.id,
         EventRegistration.status.in_(['registered', 'waitlisted'])
     ).order_by(Event.start_datetime).all()
     
-    # Get upcoming events user can register for
+    # Get upcoming events user can register for (anti-join on live registrations)
+    has_registration = select(EventRegistration.id).where(
+        EventRegistration.event_id == Event.id,
+        EventRegistration.user_id == current_user.id,
+        EventRegistration.status != 'cancelled'
+    ).exists()
     upcoming_events = Event.query.filter(
         Event.start_datetime > datetime.utcnow(),
         Event.is_active == True,
-        ~Event.id.in_([reg.event_id for reg in current_user.registrations])
+        ~has_registration
     ).order_by(Event.start_datetime).limit(6).all()
     
     # Get recent notifications
@@ -128,15 +150,16 @@ def organizer_dashboard():
         else:
             return redirect(url_for('student_dashboard'))
     
-    # Get events created by this organizer
+    page = request.args.get('page', 1, type=int)
+    
+    # Totals and upcoming count come from one aggregate query (or the snapshot)
+    stats = get_event_stats(created_by=current_user.id)
+    
+    # Get events created by this organizer, a page at a time
     created_events = Event.query.filter_by(
         created_by=current_user.id
-    ).order_by(Event.created_at.desc()).all()
-    
-    # Get statistics for organizer's events
-    total_created = len(created_events)
-    total_registrations = sum(event.current_registrations for event in created_events)
-    upcoming_events = [event for event in created_events if event.start_datetime > datetime.utcnow() and event.is_active]
+    ).order_by(Event.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
+    waitlist_counts = get_waitlist_counts([event.id for event in created_events.items])
     
     # Get recent registrations for organizer's events
     recent_registrations = db.session.query(EventRegistration, Event, User).join(
@@ -149,10 +172,12 @@ def organizer_dashboard():
     
     return render_template('organizer_dashboard.html',
                          created_events=created_events,
-                         total_created=total_created,
-                         total_registrations=total_registrations,
-                         upcoming_events=upcoming_events,
-                         recent_registrations=recent_registrations)
+                         waitlist_counts=waitlist_counts,
+                         total_created=stats['total_events'],
+                         total_registrations=stats['total_registrations'],
+                         upcoming_count=stats['upcoming_events'],
+                         recent_registrations=recent_registrations,
+                         now=datetime.utcnow())
 
 @app.route('/admin_dashboard')
 @login_required
@@ -164,13 +189,8 @@ def admin_dashboard():
         else:
             return redirect(url_for('student_dashboard'))
     
-    # Get event statistics
-    total_events = Event.query.count()
-    active_events = Event.query.filter_by(is_active=True).count()
-    upcoming_events = Event.query.filter(
-        Event.start_datetime > datetime.utcnow(),
-        Event.is_active == True
-    ).count()
+    # Get event statistics in one aggregate query (or the snapshot)
+    stats = get_event_stats()
     
     # Get recent events created by this admin
     recent_events = Event.query.filter_by(
@@ -186,9 +206,9 @@ def admin_dashboard():
     ).limit(5).all()
     
     return render_template('admin_dashboard.html',
-                         total_events=total_events,
-                         active_events=active_events,
-                         upcoming_events=upcoming_events,
+                         total_events=stats['total_events'],
+                         active_events=stats['active_events'],
+                         upcoming_events=stats['upcoming_events'],
                          recent_events=recent_events,
                          attention_events=attention_events)
 
@@ -218,6 +238,7 @@ def profile():
     return render_template('profile.html', form=form)
 
 @app.route('/events')
+@cached_page('events')
 def events():
     search_form = SearchForm()
     page = request.args.get('page', 1, type=int)
@@ -227,11 +248,8 @@ def events():
     query = Event.query.filter(Event.is_active == True)
     
     if search:
-        query = query.filter(or_(
-            Event.title.contains(search),
-            Event.description.contains(search),
-            Event.location.contains(search)
-        ))
+        # Relevance-ranked full-text match; ties fall back to start time
+        query = apply_search(query, search)
     
     if category:
         query = query.filter(Event.category == category)
@@ -244,11 +262,13 @@ def events():
     for event in events.items:
         event.icon = get_category_icon(event.category)
         event.color = get_category_color(event.category)
+    waitlist_counts = get_waitlist_counts([event.id for event in events.items])
     
     return render_template('events.html', events=events, search_form=search_form, 
-                         search=search, category=category)
+                         search=search, category=category, waitlist_counts=waitlist_counts)
 
 @app.route('/event/<int:id>')
+@cached_page('event:{id}')
 def event_detail(id):
     event = Event.query.get_or_404(id)
     event.icon = get_category_icon(event.category)
@@ -268,51 +288,25 @@ def event_detail(id):
 def register_event(id):
     event = Event.query.get_or_404(id)
     
-    # Check if user is already registered
-    existing_registration = EventRegistration.query.filter_by(
-        user_id=current_user.id,
-        event_id=event.id
-    ).first()
-    
-    if existing_registration:
-        flash('You are already registered for this event.', 'warning')
-        return redirect(url_for('event_detail', id=id))
-    
     # Check if registration is still open
     if not event.can_register():
         flash('Registration for this event is closed.', 'danger')
         return redirect(url_for('event_detail', id=id))
     
-    # Create registration
-    status = 'registered' if not event.is_full() else 'waitlisted'
-    registration = EventRegistration(
-        user_id=current_user.id,
-        event_id=event.id,
-        status=status
-    )
+    # Claim a seat and write registration + notification in one commit;
+    # duplicates are caught by the unique_user_event constraint
+    status = register_for_event(event, current_user.id)
+    if status in ('registered', 'waitlisted'):
+        invalidate_event(event.id)
     
     if status == 'registered':
-        event.current_registrations += 1
         flash(f'Successfully registered for {event.title}!', 'success')
-        create_notification(
-            user_id=current_user.id,
-            title=f"Registration Confirmed: {event.title}",
-            message=f"You have successfully registered for '{event.title}' on {event.start_datetime.strftime('%B %d, %Y at %I:%M %p')}.",
-            notification_type='registration_confirmed',
-            related_event_id=event.id
-        )
-    else:
+    elif status == 'waitlisted':
         flash(f'Event is full. You have been added to the waitlist for {event.title}.', 'info')
-        create_notification(
-            user_id=current_user.id,
-            title=f"Added to Waitlist: {event.title}",
-            message=f"The event '{event.title}' is currently full, but you have been added to the waitlist. You will be notified if a spot becomes available.",
-            notification_type='waitlist_added',
-            related_event_id=event.id
-        )
-    
-    db.session.add(registration)
-    db.session.commit()
+    elif status == 'full':
+        flash(f'{event.title} is full and does not have a waitlist.', 'danger')
+    else:
+        flash('You are already registered for this event.', 'warning')
     
     return redirect(url_for('event_detail', id=id))
 
@@ -320,26 +314,33 @@ def register_event(id):
 @login_required
 def cancel_registration(id):
     event = Event.query.get_or_404(id)
-    registration = EventRegistration.query.filter_by(
-        user_id=current_user.id,
-        event_id=event.id
-    ).first()
     
-    if not registration:
+    # Frees the seat and promotes the waitlist in the same transaction
+    if not cancel_event_registration(event, current_user.id):
         flash('You are not registered for this event.', 'warning')
         return redirect(url_for('event_detail', id=id))
-    
-    if registration.status == 'registered':
-        event.current_registrations -= 1
-        # Process waitlist
-        process_waitlist(event)
-    
-    db.session.delete(registration)
-    db.session.commit()
+    invalidate_event(event.id)
     
     flash(f'Registration cancelled for {event.title}.', 'info')
     return redirect(url_for('event_detail', id=id))
 
+@app.route('/promote_waitlist/<int:id>', methods=['POST'])
+@login_required
+def promote_waitlist(id):
+    event = Event.query.get_or_404(id)
+    
+    if not (current_user.is_admin() or (current_user.is_organizer() and event.created_by == current_user.id)):
+        flash('Access denied. You can only manage waitlists for events you created.', 'danger')
+        return redirect(url_for('event_detail', id=id))
+    
+    promoted = process_waitlist(event)
+    if promoted:
+        invalidate_event(event.id)
+        flash(f'{promoted} waitlisted participant{"s" if promoted != 1 else ""} promoted.', 'success')
+    else:
+        flash('No free seats or nobody on the waitlist.', 'info')
+    return redirect(url_for('event_registrations', event_id=id))
+
 @app.route('/create_event', methods=['GET', 'POST'])
 @login_required
 def create_event():
@@ -363,10 +364,70 @@ def create_event():
         )
         db.session.add(event)
         db.session.commit()
+        invalidate_event(event.id)
         flash(f'Event "{event.title}" created successfully!', 'success')
         return redirect(url_for('event_detail', id=event.id))
     return render_template('create_event.html', form=form)
 
+@app.route('/admin/import_events', methods=['GET', 'POST'])
+@login_required
+def import_events_upload():
+    # Bulk import pulls in process pools and extra form machinery; load it
+    # on demand rather than on every cold start
+    from imports import EVENT_IMPORT_FIELDS, read_rows, import_events
+
+    if not current_user.is_admin():
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('events'))
+    
+    form = BulkImportForm()
+    result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            rows = read_rows(upload.stream, upload.filename)
+        except ValueError as e:
+            flash(f'Could not read {upload.filename}: {e}', 'danger')
+        else:
+            result = import_events(rows, current_user.id, dry_run=form.dry_run.data,
+                                   skip_invalid=form.skip_invalid.data)
+            if result.created:
+                flash(f'{result.created} events imported.', 'success')
+            elif result.errors:
+                flash('No events imported. Fix the rows below or tick "Import valid rows".', 'warning')
+            elif form.dry_run.data:
+                flash(f'All {result.total} rows are valid. Nothing was written (dry run).', 'info')
+    return render_template('bulk_import.html', form=form, result=result,
+                         title='Import Events', noun='events', fields=EVENT_IMPORT_FIELDS)
+
+@app.route('/admin/import_users', methods=['GET', 'POST'])
+@login_required
+def import_users_upload():
+    from imports import USER_IMPORT_FIELDS, read_rows, import_users
+
+    if not current_user.is_admin():
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('events'))
+    
+    form = BulkImportForm()
+    result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            rows = read_rows(upload.stream, upload.filename)
+        except ValueError as e:
+            flash(f'Could not read {upload.filename}: {e}', 'danger')
+        else:
+            result = import_users(rows, dry_run=form.dry_run.data, skip_invalid=form.skip_invalid.data)
+            if result.created:
+                flash(f'{result.created} accounts created.', 'success')
+            elif result.errors:
+                flash('No accounts created. Fix the rows below or tick "Import valid rows".', 'warning')
+            elif form.dry_run.data:
+                flash(f'All {result.total} rows are valid. Nothing was written (dry run).', 'info')
+    return render_template('bulk_import.html', form=form, result=result,
+                         title='Import Users', noun='users', fields=USER_IMPORT_FIELDS)
+
 @app.route('/edit_event/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_event(id):
@@ -384,6 +445,7 @@ def edit_event(id):
             event.end_datetime != form.end_datetime.data or
             event.location != form.location.data
         )
+        previous_capacity = event.capacity
         
         event.title = form.title.data
         event.description = form.description.data
@@ -396,12 +458,29 @@ def edit_event(id):
         event.allow_waitlist = form.allow_waitlist.data
         event.updated_at = datetime.utcnow()
         
-        db.session.commit()
+        # Raising capacity frees seats for the waitlist in the same commit
+        promoted = 0
+        if event.capacity != previous_capacity:
+            touch_event(event.id)
+        if event.capacity > previous_capacity:
+            db.session.flush()
+            promoted = process_waitlist(event, commit=False)
         
         if significant_changes:
-            notify_event_update(event, 'updated', 'Please review the updated event details.')
+            # Fan-out runs on the job worker; the job commits with the edit
+            enqueue('notify_event_update',
+                    idempotency_key=f"event-updated:{event.id}:{event.updated_at.isoformat()}",
+                    commit=False,
+                    event_id=event.id,
+                    message_type='updated',
+                    additional_message='Please review the updated event details.')
+        
+        db.session.commit()
+        invalidate_event(event.id)
         
         flash(f'Event "{event.title}" updated successfully!', 'success')
+        if promoted:
+            flash(f'{promoted} waitlisted participant{"s" if promoted != 1 else ""} moved into the new seats.', 'info')
         return redirect(url_for('event_detail', id=event.id))
     elif request.method == 'GET':
         form.title.data = event.title
@@ -425,64 +504,156 @@ def delete_event(id):
         flash('Access denied. You can only delete events you created.', 'danger')
         return redirect(url_for('event_detail', id=id))
     
-    # Notify all registered users
-    notify_event_update(event, 'cancelled', 'We apologize for any inconvenience caused.')
+    # Queue notifications for all registered users with the cancellation
+    enqueue('notify_event_update',
+            idempotency_key=f"event-cancelled:{event.id}",
+            commit=False,
+            event_id=event.id,
+            message_type='cancelled',
+            additional_message='We apologize for any inconvenience caused.')
     
     event.is_active = False
     db.session.commit()
+    invalidate_event(event.id)
     
     flash(f'Event "{event.title}" has been cancelled.', 'info')
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/calendar')
+@cached_page('events')
 def calendar():
-    # Get events for calendar view
-    events = Event.query.filter(
-        Event.is_active == True,
-        Event.start_datetime >= datetime.utcnow() - timedelta(days=30)
-    ).all()
-    
-    # Convert events to calendar format
-    calendar_events = []
-    for event in events:
-        calendar_events.append({
-            'id': event.id,
-            'title': event.title,
-            'start': event.start_datetime.isoformat(),
-            'end': event.end_datetime.isoformat(),
-            'url': url_for('event_detail', id=event.id),
-            'color': get_category_color(event.category),
-            'category': event.category
-        })
-    
-    return render_template('calendar.html', events=calendar_events)
+    # Events are fetched lazily per visible window from calendar_feed
+    return render_template('calendar.html')
+
+def parse_calendar_bound(value):
+    """Parse a FullCalendar ISO bound into a naive UTC datetime"""
+    try:
+        bound = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if bound.tzinfo is not None:
+        bound = bound.astimezone(timezone.utc).replace(tzinfo=None)
+    return bound
+
+@app.route('/api/calendar')
+@cached_page('events', anonymous_only=False)
+def calendar_feed():
+    start = parse_calendar_bound(request.args.get('start'))
+    end = parse_calendar_bound(request.args.get('end'))
+    if not start or not end or end <= start or end - start > timedelta(days=CALENDAR_MAX_WINDOW_DAYS):
+        abort(400)
+    
+    in_window = and_(Event.start_datetime < end, Event.end_datetime >= start)
+    
+    # Validators come from one aggregate: cancelled events still count towards
+    # the latest updated_at so a cancellation changes the ETag
+    last_updated, active_count = db.session.execute(
+        select(
+            func.max(Event.updated_at),
+            func.count(case((Event.is_active == True, 1)))
+        ).where(in_window)
+    ).one()
+    etag = f"{start.isoformat()}|{end.isoformat()}|{last_updated.isoformat() if last_updated else ''}|{active_count}"
+    etag = hashlib.sha1(etag.encode()).hexdigest()
+    last_modified = last_updated.replace(microsecond=0, tzinfo=timezone.utc) if last_updated else None
+    
+    not_modified = etag in request.if_none_match or (
+        not request.if_none_match and last_modified and request.if_modified_since
+        and last_modified <= request.if_modified_since
+    )
+    if not_modified:
+        response = app.response_class(status=304)
+    else:
+        rows = db.session.execute(
+            select(Event.id, Event.title, Event.start_datetime, Event.end_datetime, Event.category)
+            .where(in_window, Event.is_active == True)
+            .order_by(Event.start_datetime)
+        ).all()
+        detail_url = url_for('event_detail', id=0).rsplit('/', 1)[0]
+        response = jsonify([{
+            'id': row.id,
+            'title': row.title,
+            'start': row.start_datetime.isoformat(),
+            'end': row.end_datetime.isoformat(),
+            'url': f"{detail_url}/{row.id}",
+            'color': get_category_color(row.category),
+            'category': row.category
+        } for row in rows])
+    
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = CALENDAR_CACHE_SECONDS
+    return response
 
 @app.route('/notifications')
 @login_required
+@writes_on_get
 def notifications():
-    page = request.args.get('page', 1, type=int)
-    notifications = Notification.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Notification.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
+    cursor = request.args.get('cursor')
+    unread_total = current_user.unread_count
+    notifications, next_cursor = get_notifications_page(current_user.id, cursor)
+    
+    # Mark the notifications on screen as read, but commit only after
+    # rendering: committing expires the rows, which would reload each one
+    # already read and hide the "New" badges
+    mark_notifications_read(
+        current_user.id,
+        [notification.id for notification in notifications if not notification.is_read],
+        commit=False
     )
     
-    # Mark notifications as read when viewed
-    unread_notifications = Notification.query.filter_by(
-        user_id=current_user.id,
-        is_read=False
-    ).all()
-    
-    for notification in unread_notifications:
-        notification.is_read = True
-    
+    page = render_template('notifications.html',
+                         notifications=notifications,
+                         next_cursor=next_cursor,
+                         unread_total=unread_total)
     db.session.commit()
+    return page
+
+@app.route('/api/notifications')
+@login_required
+@writes_on_get
+def notifications_feed():
+    notifications, next_cursor = get_notifications_page(current_user.id, request.args.get('cursor'))
+    mark_notifications_read(
+        current_user.id,
+        [notification.id for notification in notifications if not notification.is_read],
+        commit=False
+    )
     
-    return render_template('notifications.html', notifications=notifications)
+    response = jsonify(
+        notifications=[{
+            'id': notification.id,
+            'title': notification.title,
+            'message': notification.message,
+            'type': notification.type,
+            'is_read': notification.is_read,
+            'created_at': notification.created_at.isoformat(),
+            'event': {
+                'id': notification.related_event.id,
+                'title': notification.related_event.title,
+                'category': notification.related_event.category,
+                'url': url_for('event_detail', id=notification.related_event.id)
+            } if notification.related_event else None
+        } for notification in notifications],
+        next_cursor=next_cursor
+    )
+    db.session.commit()
+    return response
+
+@app.route('/notifications/mark_all_read', methods=['POST'])
+@login_required
+def mark_all_notifications_read():
+    marked = mark_notifications_read(current_user.id)
+    flash(f'{marked} notification{"s" if marked != 1 else ""} marked as read.', 'info')
+    return redirect(url_for('notifications'))
 
 @app.route('/event_registrations/<int:event_id>')
 @login_required
 def event_registrations(event_id):
+    from exports import EXPORT_COLUMNS, DEFAULT_EXPORT_COLUMNS
+
     event = Event.query.get_or_404(event_id)
     
     # Check if user has permission to view registrations
@@ -490,30 +661,81 @@ def event_registrations(event_id):
         flash('Access denied. You can only view registrations for events you created.', 'danger')
         return redirect(url_for('events'))
     
-    # Get all registrations for this event
+    page = request.args.get('page', 1, type=int)
+    waitlist_page = request.args.get('waitlist_page', 1, type=int)
+    
+    # Counts per status in one query; the lists themselves are paginated
+    status_counts = dict(db.session.query(
+        EventRegistration.status, func.count(EventRegistration.id)
+    ).filter(
+        EventRegistration.event_id == event_id
+    ).group_by(EventRegistration.status).all())
+    
     registrations = db.session.query(EventRegistration, User).join(
         User, EventRegistration.user_id == User.id
     ).filter(
         EventRegistration.event_id == event_id
-    ).order_by(EventRegistration.registration_date.desc()).all()
-    
-    # Separate by status
-    registered_users = [(reg, user) for reg, user in registrations if reg.status == 'registered']
-    waitlisted_users = [(reg, user) for reg, user in registrations if reg.status == 'waitlisted']
+    )
+    registered_users = registrations.filter(
+        EventRegistration.status == 'registered'
+    ).order_by(EventRegistration.registration_date.desc(), EventRegistration.id.desc()).paginate(
+        page=page, per_page=REGISTRATIONS_PER_PAGE, error_out=False, count=False
+    )
+    # Waitlist in queue order so positions match promotion order
+    waitlisted_users = registrations.filter(
+        EventRegistration.status == 'waitlisted'
+    ).order_by(EventRegistration.registration_date, EventRegistration.id).paginate(
+        page=waitlist_page, per_page=REGISTRATIONS_PER_PAGE, error_out=False, count=False
+    )
+    registered_users.total = status_counts.get('registered', 0)
+    waitlisted_users.total = status_counts.get('waitlisted', 0)
     
     return render_template('event_registrations.html', 
                          event=event,
                          registered_users=registered_users,
-                         waitlisted_users=waitlisted_users)
+                         waitlisted_users=waitlisted_users,
+                         export_columns=EXPORT_COLUMNS,
+                         default_export_columns=DEFAULT_EXPORT_COLUMNS)
+
+@app.route('/event_registrations/<int:event_id>/export')
+@login_required
+def export_registrations(event_id):
+    from exports import parse_export_columns, iter_registration_rows, stream_csv, stream_xlsx
+
+    event = Event.query.get_or_404(event_id)
+    
+    if not (current_user.is_admin() or (current_user.is_organizer() and event.created_by == current_user.id)):
+        flash('Access denied. You can only export registrations for events you created.', 'danger')
+        return redirect(url_for('events'))
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        abort(400)
+    columns = parse_export_columns(
+        [key for value in request.args.getlist('columns') for key in value.split(',')]
+    )
+    statuses = [status for status in request.args.getlist('status')
+                if status in ('registered', 'waitlisted', 'cancelled')]
+    
+    rows = iter_registration_rows(event.id, columns, statuses)
+    filename = f"event-{event.id}-registrations.{export_format}"
+    if export_format == 'xlsx':
+        body = stream_xlsx(columns, rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body = stream_csv(columns, rows)
+        mimetype = 'text/csv'
+    return app.response_class(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @app.context_processor
 def inject_notifications():
     if current_user.is_authenticated:
-        unread_count = Notification.query.filter_by(
-            user_id=current_user.id,
-            is_read=False
-        ).count()
-        return dict(unread_notifications_count=unread_count)
+        # Denormalized on the user row, which is already loaded
+        return dict(unread_notifications_count=current_user.unread_count)
     return dict(unread_notifications_count=0)
 
 @app.context_processor
@@ -0,0 +1,115 @@
+import re
+import logging
+import click
+from sqlalchemy import text, func, literal_column, or_, Integer, Float
+from app import app, db
+from models import Event
+
+# Full-text search over Event.title/description/location.
+# SQLite: an external-content FTS5 table kept in sync by triggers.
+# Postgres: a generated tsvector column with a GIN index.
+# Anything else falls back to LIKE scans.
+
+SQLITE_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5(
+        title, description, location,
+        content='event', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_ai AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_ad AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_au AFTER UPDATE OF title, description, location ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO event_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+]
+
+POSTGRES_SCHEMA = [
+    """ALTER TABLE event ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'C')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_event_search_vector ON event USING GIN (search_vector)",
+]
+
+def search_backend():
+    """Return 'fts5', 'postgres' or 'like' for the configured database"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return 'fts5'
+    if dialect == 'postgresql':
+        return 'postgres'
+    return 'like'
+
+def ensure_search_index():
+    """Create the search index if missing, indexing existing events once"""
+    backend = search_backend()
+    if backend == 'fts5':
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'event_fts'")
+        ).scalar()
+        for statement in SQLITE_SCHEMA:
+            db.session.execute(text(statement))
+        db.session.commit()
+        if not exists:
+            rebuild_search_index()
+    elif backend == 'postgres':
+        for statement in POSTGRES_SCHEMA:
+            db.session.execute(text(statement))
+        db.session.commit()
+
+def rebuild_search_index():
+    """Re-index every event from the event table"""
+    backend = search_backend()
+    if backend == 'fts5':
+        db.session.execute(text("INSERT INTO event_fts(event_fts) VALUES ('rebuild')"))
+    elif backend == 'postgres':
+        db.session.execute(text("REINDEX INDEX ix_event_search_vector"))
+    db.session.commit()
+    logging.info(f"Search index rebuilt ({backend})")
+
+def _fts5_query(search):
+    # Quote every term so user input can't inject FTS5 syntax; prefix-match
+    # each term so partial words still find results while typing.
+    terms = re.findall(r'\w+', search)
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+def apply_search(query, search):
+    """Filter an Event query by search terms, ordered by relevance"""
+    backend = search_backend()
+    if backend == 'fts5':
+        match = _fts5_query(search)
+        if not match:
+            return query
+        ranked = text(
+            "SELECT rowid AS id, bm25(event_fts, 10.0, 1.0, 5.0) AS rank "
+            "FROM event_fts WHERE event_fts MATCH :match"
+        ).bindparams(match=match).columns(id=Integer, rank=Float).subquery()
+        return query.join(ranked, ranked.c.id == Event.id).order_by(ranked.c.rank)
+    if backend == 'postgres':
+        tsquery = func.websearch_to_tsquery('english', search)
+        search_vector = literal_column('event.search_vector')
+        return query.filter(search_vector.op('@@')(tsquery)).order_by(
+            func.ts_rank(search_vector, tsquery).desc()
+        )
+    return query.filter(or_(
+        Event.title.contains(search),
+        Event.description.contains(search),
+        Event.location.contains(search)
+    ))
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Create and fully rebuild the event search index"""
+    ensure_search_index()
+    rebuild_search_index()
+    click.echo(f"Search index rebuilt using {search_backend()}")
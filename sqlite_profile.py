@@ -0,0 +1,113 @@
+import sqlite3
+import logging
+from flask import current_app, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Production settings for file-backed SQLite. Every new connection gets WAL
+# journaling (readers no longer block behind a writer), a busy timeout
+# (writers wait for the lock instead of failing with "database is locked")
+# and larger page cache / mmap. pysqlite's own transaction handling is
+# switched off so we control how transactions begin. A read transaction
+# that later writes can fail with "database is locked" without waiting, so
+# writes must run in BEGIN IMMEDIATE transactions. Request transactions
+# start as plain BEGIN and are restarted as BEGIN IMMEDIATE right before
+# their first write; taking the lock up front would hold it through
+# everything the request does before writing (e.g. hashing a password at
+# login), and every other writer would queue behind that.
+
+# Populated by configure(); empty means the profile is off
+SETTINGS = {}
+
+def _uses_profile(config):
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    file_backed = uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') != 'sqlite:'
+    return file_backed and config['SQLITE_PROFILE']
+
+def engine_options(config):
+    """SQLAlchemy engine options for the configured database"""
+    if not _uses_profile(config):
+        return {'pool_recycle': 300, 'pool_pre_ping': True}
+    return {
+        # File databases need no recycling or liveness checks; a small pool
+        # bounds how many connections wait on the write lock per process
+        'pool_size': config['SQLITE_POOL_SIZE'],
+        'max_overflow': config['SQLITE_POOL_SIZE'] * 2,
+        'pool_timeout': 30,
+        'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000, 'check_same_thread': False},
+    }
+
+def configure(config):
+    """Enable the profile for SQLite engines created after this call"""
+    SETTINGS.clear()
+    if _uses_profile(config):
+        SETTINGS.update(
+            busy_timeout=config['SQLITE_BUSY_TIMEOUT'],
+            mmap_size=config['SQLITE_MMAP_SIZE'],
+            cache_size=config['SQLITE_CACHE_SIZE'],
+        )
+
+def writes_on_get(view):
+    """Mark a view that writes on GET, so it uses the primary database
+
+    POST/PUT/PATCH/DELETE requests always do.
+    """
+    view.writes_on_get = True
+    return view
+
+def request_writes():
+    """Whether the current request may write to the database"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'writes_on_get', False)
+
+def _wants_immediate():
+    # CLI commands, workers and timers mostly write
+    return not has_request_context()
+
+def _is_write(statement, context):
+    if getattr(context, 'isdml', False):
+        return True
+    # Raw SQL writes, savepoints (only taken to write inside them) and DDL
+    return statement.lstrip()[:9].upper().startswith(
+        ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'SAVEPOINT', 'CREATE', 'DROP', 'ALTER')
+    )
+
+@event.listens_for(Engine, 'connect')
+def _apply_pragmas(dbapi_connection, connection_record):
+    if not SETTINGS or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    # Let SQLAlchemy's begin event below emit BEGIN instead of pysqlite
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(SETTINGS['busy_timeout'])}")
+        mode = cursor.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != 'wal':
+            logging.warning(f"SQLite journal_mode is {mode}, not WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA mmap_size = {int(SETTINGS['mmap_size'])}")
+        cursor.execute(f"PRAGMA cache_size = -{int(SETTINGS['cache_size'])}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+@event.listens_for(Engine, 'begin')
+def _begin(conn):
+    if not SETTINGS or conn.dialect.name != 'sqlite':
+        return
+    immediate = _wants_immediate()
+    conn.info['sqlite_immediate'] = immediate
+    conn.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _upgrade_before_write(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get('sqlite_immediate', True) or not _is_write(statement, context):
+        return
+    # Nothing has been written yet, so ending the read transaction loses no
+    # work; reads after this see the latest commits, as they would on
+    # Postgres under READ COMMITTED
+    conn.info['sqlite_immediate'] = True
+    cursor.connection.execute("COMMIT")
+    cursor.connection.execute("BEGIN IMMEDIATE")
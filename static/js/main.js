@@ -452,6 +452,94 @@ class NotificationHandler {
     }
 }
 
+// Live seat counts and notification badge over Server-Sent Events
+class LiveUpdateHandler {
+    constructor() {
+        this.url = document.body.dataset.liveUrl;
+        this.maxEvents = parseInt(document.body.dataset.liveMaxEvents || '50');
+        this.badge = document.querySelector('[data-live-unread]');
+        const containers = document.querySelectorAll('[data-live-event]');
+        this.eventIds = [...new Set(Array.from(containers, el => el.dataset.liveEvent))].slice(0, this.maxEvents);
+        this.source = null;
+        this.retryDelay = 5000;
+
+        if (!this.url || (!this.badge && this.eventIds.length === 0)) return;
+        this.init();
+    }
+
+    init() {
+        this.connect(false);
+
+        // Hidden tabs give their stream back; the server limits open streams
+        document.addEventListener('visibilitychange', () => {
+            if (document.hidden) {
+                this.disconnect();
+            } else if (!this.source) {
+                this.connect(true);
+            }
+        });
+        window.addEventListener('pagehide', () => this.disconnect());
+    }
+
+    connect(resync) {
+        const params = new URLSearchParams();
+        if (this.eventIds.length) params.set('events', this.eventIds.join(','));
+        // Ask for the current state when updates may have been missed
+        if (resync) params.set('resync', '1');
+
+        this.source = new EventSource(`${this.url}?${params}`);
+        this.source.addEventListener('open', () => {
+            this.retryDelay = 5000;
+        });
+        this.source.addEventListener('seats', (e) => this.updateSeats(JSON.parse(e.data)));
+        this.source.addEventListener('unread', (e) => this.updateBadge(JSON.parse(e.data).unread));
+        this.source.addEventListener('error', () => {
+            // Dropped streams are retried by the browser; refused ones (e.g.
+            // 503 at the connection limit) are closed, so back off and retry
+            if (!this.source || this.source.readyState !== EventSource.CLOSED) return;
+            this.disconnect();
+            clearTimeout(this.retryTimer);
+            this.retryTimer = setTimeout(() => {
+                if (!document.hidden && !this.source) this.connect(true);
+            }, this.retryDelay);
+            this.retryDelay = Math.min(this.retryDelay * 2, 120000);
+        });
+    }
+
+    disconnect() {
+        if (this.source) {
+            this.source.close();
+            this.source = null;
+        }
+    }
+
+    updateSeats(data) {
+        document.querySelectorAll(`[data-live-event="${data.id}"]`).forEach(container => {
+            container.querySelectorAll('[data-live-field]').forEach(field => {
+                const value = data[field.dataset.liveField];
+                if (value !== undefined) field.textContent = value;
+            });
+            container.querySelectorAll('[data-live-show]').forEach(element => {
+                element.classList.toggle('d-none', !data[element.dataset.liveShow]);
+            });
+
+            const bar = container.querySelector('[data-live-progress]');
+            if (bar && data.capacity) {
+                const fill = Math.round((data.current_registrations / data.capacity) * 100);
+                bar.style.width = `${fill}%`;
+                bar.classList.remove('bg-success', 'bg-warning', 'bg-danger');
+                bar.classList.add(fill < 70 ? 'bg-success' : fill < 90 ? 'bg-warning' : 'bg-danger');
+            }
+        });
+    }
+
+    updateBadge(count) {
+        if (!this.badge) return;
+        this.badge.textContent = count;
+        this.badge.classList.toggle('d-none', count <= 0);
+    }
+}
+
 // Responsive utilities
 class ResponsiveHandler {
     constructor() {
@@ -522,6 +610,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize notification handling
     new NotificationHandler();
     
+    // Initialize live seat counts and notification badge
+    new LiveUpdateHandler();
+    
     // Initialize responsive utilities
     new ResponsiveHandler();
     
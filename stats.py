@@ -0,0 +1,93 @@
+import time
+import logging
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import select, delete, insert, func, case, and_
+from app import app, db
+from models import Event, EventRegistration, StatsSnapshot
+
+# Dashboard counters are computed in the database with one aggregate query
+# per dashboard. With STATS_SNAPSHOT_MAX_AGE set, they are read from the
+# stats_snapshot table instead and refreshed by `flask refresh-stats`.
+
+GLOBAL_SCOPE = 'global'
+
+def organizer_scope(user_id):
+    return f'organizer:{user_id}'
+
+def event_stats_columns(now):
+    """Aggregate columns shared by the live queries and the snapshot refresh"""
+    return (
+        func.count(Event.id).label('total_events'),
+        func.coalesce(func.sum(case((Event.is_active == True, 1), else_=0)), 0).label('active_events'),
+        func.coalesce(func.sum(case(
+            (and_(Event.is_active == True, Event.start_datetime > now), 1), else_=0
+        )), 0).label('upcoming_events'),
+        func.coalesce(func.sum(Event.current_registrations), 0).label('total_registrations'),
+    )
+
+def live_event_stats(created_by=None):
+    """Aggregate event counters in a single query, optionally per creator"""
+    now = datetime.utcnow()
+    statement = select(*event_stats_columns(now))
+    if created_by is not None:
+        statement = statement.where(Event.created_by == created_by)
+    stats = dict(db.session.execute(statement).one()._mapping)
+    stats['refreshed_at'] = now
+    return stats
+
+def get_event_stats(created_by=None):
+    """Dashboard counters, from a fresh snapshot if there is one"""
+    max_age = app.config['STATS_SNAPSHOT_MAX_AGE']
+    if max_age:
+        scope = organizer_scope(created_by) if created_by is not None else GLOBAL_SCOPE
+        snapshot = db.session.get(StatsSnapshot, scope)
+        if snapshot and snapshot.refreshed_at >= datetime.utcnow() - timedelta(seconds=max_age):
+            return snapshot.to_dict()
+    return live_event_stats(created_by)
+
+def get_waitlist_counts(event_ids):
+    """Map event id to waitlist size for a page of events in one query"""
+    if not event_ids:
+        return {}
+    rows = db.session.execute(
+        select(EventRegistration.event_id, func.count(EventRegistration.id))
+        .where(EventRegistration.event_id.in_(list(event_ids)), EventRegistration.status == 'waitlisted')
+        .group_by(EventRegistration.event_id)
+    ).all()
+    return dict(rows)
+
+def refresh_stats_snapshots():
+    """Recompute every snapshot row in one transaction
+
+    Returns the number of rows written.
+    """
+    now = datetime.utcnow()
+    columns = event_stats_columns(now)
+    global_row = db.session.execute(select(*columns)).one()
+    organizer_rows = db.session.execute(
+        select(Event.created_by, *columns).group_by(Event.created_by)
+    ).all()
+
+    rows = [dict(global_row._mapping, scope=GLOBAL_SCOPE, refreshed_at=now)]
+    for row in organizer_rows:
+        values = dict(row._mapping)
+        rows.append(dict(values, scope=organizer_scope(values.pop('created_by')), refreshed_at=now))
+
+    db.session.execute(delete(StatsSnapshot))
+    db.session.execute(insert(StatsSnapshot), rows)
+    db.session.commit()
+    logging.info(f"Stats snapshot refreshed: {len(rows)} rows")
+    return len(rows)
+
+@app.cli.command('refresh-stats')
+@click.option('--loop', is_flag=True, help='Keep refreshing instead of exiting after one pass.')
+@click.option('--interval', default=60.0, show_default=True, help='Seconds between refreshes.')
+def refresh_stats_command(loop, interval):
+    """Recompute the dashboard stats snapshot"""
+    while True:
+        written = refresh_stats_snapshots()
+        click.echo(f"Refreshed {written} stats snapshot rows")
+        if not loop:
+            break
+        time.sleep(interval)
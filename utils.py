@@ -1,26 +1,72 @@
-from flask_mail import Message
-from app import mail, app
+from datetime import datetime
+from sqlalchemy import insert, select, update, case, func, or_, and_
+from sqlalchemy.orm import joinedload
 from models import Notification, db
 import logging
 
-def send_email(subject, recipient, template, **kwargs):
-    """Send email notification"""
+# Rows per executemany batch for bulk notification inserts
+NOTIFICATION_BATCH_SIZE = 1000
+
+def send_email(subject, recipient, template, commit=True, **kwargs):
+    """Queue an email in the outbox; the worker delivers it in batches"""
+    from mailer import queue_email
     try:
-        msg = Message(
-            subject=subject,
-            recipients=[recipient] if isinstance(recipient, str) else recipient,
-            html=template,
-            sender=app.config['MAIL_DEFAULT_SENDER']
-        )
-        mail.send(msg)
-        logging.info(f"Email sent to {recipient} with subject: {subject}")
+        queue_email(subject, recipient, template, commit=commit)
+        logging.info(f"Email queued for {recipient} with subject: {subject}")
         return True
     except Exception as e:
-        logging.error(f"Failed to send email to {recipient}: {str(e)}")
+        if not commit:
+            # The caller owns the transaction and decides how to recover
+            raise
+        logging.error(f"Failed to queue email to {recipient}: {str(e)}")
+        db.session.rollback()
         return False
 
-def create_notification(user_id, title, message, notification_type, related_event_id=None):
-    """Create a new notification for a user"""
+def adjust_unread_count(user_ids, delta):
+    """Shift the cached unread counters of users by delta, never below zero"""
+    from models import User
+    from identity import forget_identity
+    from live import touch_users
+    
+    if not user_ids:
+        return
+    forget_identity(*user_ids)
+    touch_users(*user_ids)
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(list(user_ids)))
+        .values(unread_count=case(
+            (User.unread_count + delta < 0, 0),
+            else_=User.unread_count + delta
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+def reconcile_unread_counts():
+    """Recompute cached unread counters from the notification table
+
+    Returns the number of users whose counter had drifted.
+    """
+    from models import User
+    
+    actual = select(func.count(Notification.id)).where(
+        Notification.user_id == User.id,
+        Notification.is_read == False
+    ).scalar_subquery()
+    result = db.session.execute(
+        update(User)
+        .where(User.unread_count != actual)
+        .values(unread_count=actual)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def create_notification(user_id, title, message, notification_type, related_event_id=None, commit=True):
+    """Create a new notification for a user
+
+    Pass commit=False to stage the notification in the caller's transaction.
+    """
     try:
         notification = Notification(
             user_id=user_id,
@@ -30,70 +76,149 @@ def create_notification(user_id, title, message, notification_type, related_even
             related_event_id=related_event_id
         )
         db.session.add(notification)
+        adjust_unread_count([user_id], 1)
+        if not commit:
+            return notification
         db.session.commit()
         logging.info(f"Notification created for user {user_id}: {title}")
         return notification
     except Exception as e:
+        if not commit:
+            # The caller owns the transaction and decides how to recover
+            raise
         logging.error(f"Failed to create notification: {str(e)}")
         db.session.rollback()
         return None
 
-def notify_event_update(event, message_type, additional_message=""):
-    """Send notifications to all registered users about event updates"""
-    from models import EventRegistration, User
-    
-    registrations = EventRegistration.query.filter_by(event_id=event.id).all()
+def bulk_create_notifications(user_ids, title, message, notification_type, related_event_id=None, commit=True):
+    """Insert the same notification for many users in chunked batches"""
+    created_at = datetime.utcnow()
+    user_ids = list(user_ids)
+    try:
+        for start in range(0, len(user_ids), NOTIFICATION_BATCH_SIZE):
+            adjust_unread_count(user_ids[start:start + NOTIFICATION_BATCH_SIZE], 1)
+            db.session.execute(insert(Notification), [
+                {
+                    'user_id': user_id,
+                    'title': title,
+                    'message': message,
+                    'type': notification_type,
+                    'is_read': False,
+                    'created_at': created_at,
+                    'related_event_id': related_event_id
+                }
+                for user_id in user_ids[start:start + NOTIFICATION_BATCH_SIZE]
+            ])
+        if commit:
+            db.session.commit()
+    except Exception as e:
+        if not commit:
+            raise
+        logging.error(f"Failed to create bulk notification: {str(e)}")
+        db.session.rollback()
+        return 0
+    logging.info(f"{len(user_ids)} notifications created: {title}")
+    return len(user_ids)
+
+def build_event_update_message(event, message_type, additional_message=""):
+    """Return the (title, message) pair for an event update notification"""
+    if message_type == 'cancelled':
+        title = f"Event Cancelled: {event.title}"
+        message = f"Unfortunately, the event '{event.title}' scheduled for {event.start_datetime.strftime('%B %d, %Y at %I:%M %p')} has been cancelled. {additional_message}"
+    elif message_type == 'updated':
+        title = f"Event Updated: {event.title}"
+        message = f"The event '{event.title}' has been updated. Please check the event details for any changes. {additional_message}"
+    elif message_type == 'reminder':
+        title = f"Event Reminder: {event.title}"
+        message = f"This is a reminder that you are registered for '{event.title}' on {event.start_datetime.strftime('%B %d, %Y at %I:%M %p')} at {event.location}."
+    else:
+        title = f"Event Notification: {event.title}"
+        message = additional_message
+    return title, message
+
+def mark_notifications_read(user_id, notification_ids=None, commit=True):
+    """Mark a user's unread notifications read with one UPDATE
+
+    Limit to notification_ids to mark only the rows on screen. Returns the
+    number of notifications marked.
+    """
+    statement = update(Notification).where(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    )
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        statement = statement.where(Notification.id.in_(list(notification_ids)))
+    marked = db.session.execute(
+        statement.values(is_read=True).execution_options(synchronize_session=False)
+    ).rowcount
+    adjust_unread_count([user_id], -marked)
+    if commit:
+        db.session.commit()
+    return marked
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) keyset position as an opaque string"""
+    return f"{created_at.isoformat()}_{row_id}"
+
+def decode_cursor(cursor):
+    """Decode a keyset cursor; returns None if it is missing or malformed"""
+    try:
+        created_at, row_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def get_notifications_page(user_id, cursor=None, per_page=20):
+    """Keyset-paginate a user's notifications, newest first
+
+    Returns (notifications, next_cursor); next_cursor is None on the last
+    page. No COUNT query is issued.
+    """
+    query = Notification.query.options(joinedload(Notification.related_event)).filter(
+        Notification.user_id == user_id
+    )
+    position = decode_cursor(cursor)
+    if position:
+        created_at, row_id = position
+        query = query.filter(or_(
+            Notification.created_at < created_at,
+            and_(Notification.created_at == created_at, Notification.id < row_id)
+        ))
+    rows = query.order_by(
+        Notification.created_at.desc(), Notification.id.desc()
+    ).limit(per_page + 1).all()
     
-    for registration in registrations:
-        user = User.query.get(registration.user_id)
-        if user:
-            if message_type == 'cancelled':
-                title = f"Event Cancelled: {event.title}"
-                message = f"Unfortunately, the event '{event.title}' scheduled for {event.start_datetime.strftime('%B %d, %Y at %I:%M %p')} has been cancelled. {additional_message}"
-            elif message_type == 'updated':
-                title = f"Event Updated: {event.title}"
-                message = f"The event '{event.title}' has been updated. Please check the event details for any changes. {additional_message}"
-            elif message_type == 'reminder':
-                title = f"Event Reminder: {event.title}"
-                message = f"This is a reminder that you are registered for '{event.title}' on {event.start_datetime.strftime('%B %d, %Y at %I:%M %p')} at {event.location}."
-            else:
-                title = f"Event Notification: {event.title}"
-                message = additional_message
-            
-            create_notification(
-                user_id=user.id,
-                title=title,
-                message=message,
-                notification_type='event_update',
-                related_event_id=event.id
-            )
-
-def process_waitlist(event):
-    """Process waitlist when spots become available"""
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+def notify_event_update(event, message_type, additional_message="", commit=True):
+    """Send notifications to all registered users about event updates
+
+    Returns the number of notifications written.
+    """
     from models import EventRegistration
     
-    available_spots = event.get_available_spots()
-    if available_spots <= 0:
-        return
-    
-    waitlisted = EventRegistration.query.filter_by(
-        event_id=event.id, 
-        status='waitlisted'
-    ).order_by(EventRegistration.registration_date).limit(available_spots).all()
-    
-    for registration in waitlisted:
-        registration.status = 'registered'
-        event.current_registrations += 1
-        
-        create_notification(
-            user_id=registration.user_id,
-            title=f"You're off the waitlist: {event.title}",
-            message=f"Great news! A spot has opened up for '{event.title}' and you have been moved from the waitlist to confirmed registration.",
-            notification_type='waitlist_promoted',
-            related_event_id=event.id
+    user_ids = db.session.execute(
+        select(EventRegistration.user_id).where(
+            EventRegistration.event_id == event.id,
+            EventRegistration.status != 'cancelled'
         )
+    ).scalars().all()
     
-    db.session.commit()
+    title, message = build_event_update_message(event, message_type, additional_message)
+    return bulk_create_notifications(
+        user_ids,
+        title=title,
+        message=message,
+        notification_type='event_update',
+        related_event_id=event.id,
+        commit=commit
+    )
 
 def get_category_icon(category):
     """Get Font Awesome icon for event category"""